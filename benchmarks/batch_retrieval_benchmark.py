@@ -0,0 +1,70 @@
+# Retrieval throughput on CPU: one query per call versus retrieve_many() batches, and
+# concurrent single calls with and without the micro-batching queue.
+# Run from the project root:  python -m benchmarks.batch_retrieval_benchmark --batch-sizes 1 4 16 64
+# Query embedding and result caches are disabled, so every query pays for encoding.
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.rag_engine import RAGEngine
+from benchmarks.retrieval_benchmark import LABELLED_QUERIES
+
+
+def _queries(n):
+    # Distinct texts (the caches are off anyway) with the lengths of real questions.
+    base = [query for query, _ in LABELLED_QUERIES]
+    return [base[i] if i < len(base) else f"{base[i % len(base)]} ({i // len(base)})" for i in range(n)]
+
+
+def _engine(args, **kwargs):
+    return RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path=args.db_path,
+                     model_name=args.model, backend=args.backend, retrieval_mode=args.mode,
+                     query_cache_size=0, cache_results=False, **kwargs)
+
+
+def batched(engine, queries, batch_size, top_k):
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        engine.retrieve_many(queries[i:i + batch_size], top_k=top_k)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def concurrent(engine, queries, threads, top_k):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda query: engine.retrieve(query, top_k=top_k), queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent callers for the micro-batching test.")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="Micro-batching wait window.")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--mode", default="dense")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--db-path", default="chroma_db")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    queries = _queries(args.queries)
+    engine = _engine(args)
+    engine.warm()
+    print(f"{len(queries)} queries, {args.mode} retrieval, {args.backend} store, top {args.top_k}")
+    print(f"{'retrieve_many batch size':<34}{'queries/s':>10}")
+    for batch_size in args.batch_sizes:
+        print(f"{batch_size:<34}{batched(engine, queries, batch_size, args.top_k):>10.0f}")
+
+    print(f"\n{args.threads} threads calling retrieve() concurrently")
+    print(f"{'':<34}{'queries/s':>10}{'avg batch':>11}")
+    print(f"{'no batching':<34}{concurrent(engine, queries, args.threads, args.top_k):>10.0f}{1:>11.1f}")
+    engine = _engine(args, micro_batch_ms=args.window_ms, micro_batch_size=max(args.batch_sizes))
+    engine.warm()
+    qps = concurrent(engine, queries, args.threads, args.top_k)
+    print(f"{f'micro-batching, {args.window_ms:g} ms window':<34}{qps:>10.0f}"
+          f"{engine.cache_stats()['micro_batches']['avg_batch_size']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Prompt size and recall of the RAG context: the old "join the top 3 chunks" versus ContextBuilder.
+# Run from the project root:  python -m benchmarks.context_benchmark --budget 250
+# Recall uses the labelled queries of the retrieval benchmark: a query is recalled when the
+# context handed to the LLM still contains one of its phrases.
+import argparse
+import statistics
+from src.rag_engine import RAGEngine
+from src.context_builder import ContextBuilder, SEPARATOR, estimate_tokens
+from benchmarks.retrieval_benchmark import LABELLED_QUERIES
+
+# The RAG prompt template without its context and question, for whole-prompt token counts.
+PROMPT_OVERHEAD_TOKENS = 164
+
+
+def _report(name, contexts):
+    tokens = [estimate_tokens(context) + PROMPT_OVERHEAD_TOKENS + estimate_tokens(query)
+              for (query, _), context in zip(LABELLED_QUERIES, contexts)]
+    recalled = sum(any(phrase in context.lower() for phrase in phrases)
+                   for (_, phrases), context in zip(LABELLED_QUERIES, contexts))
+    print(f"{name:<28}{recalled / len(LABELLED_QUERIES):>8.0%}{statistics.mean(tokens):>14.0f}{max(tokens):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=250)
+    parser.add_argument("--db-path", default="chroma_db")
+    args = parser.parse_args()
+
+    engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path=args.db_path)
+    builder = ContextBuilder(token_budget=args.budget)
+
+    queries = [query for query, _ in LABELLED_QUERIES]
+    naive = [SEPARATOR.join(documents) for documents in engine.retrieve_many(queries, top_k=3)]
+    built, dropped = [], 0
+    for hits in engine.search_many(queries, top_k=args.top_k):
+        context, stats = builder.build(hits)
+        built.append(context)
+        dropped += stats["duplicates_dropped"]
+
+    print(f"{len(LABELLED_QUERIES)} queries; prompt tokens estimated at ~4 characters per token")
+    print(f"{'context':<28}{'recall':>8}{'avg prompt':>14}{'max prompt':>12}")
+    _report("top 3 joined", naive)
+    _report(f"builder top {args.top_k}, {args.budget} tokens", built)
+    print(f"near-duplicate / same-section chunks dropped: {dropped}")
+
+
+if __name__ == "__main__":
+    main()
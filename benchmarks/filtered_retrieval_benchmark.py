@@ -0,0 +1,152 @@
+# Retrieval with and without metadata pre-filtering on a larger synthetic knowledge base.
+# Run from the project root:  python -m benchmarks.filtered_retrieval_benchmark --plans 40 --platforms 80
+# The generated KB has many plans, platforms, policies and services that mention each other
+# (a platform section names the plan that includes it, a refund policy names its plan's price),
+# so an unfiltered search has plenty of near-miss chunks of the wrong kind. Every query is
+# labelled with the kind of chunk that answers it and a fact only that chunk holds; filters
+# come from src.query_filters, exactly as the agent derives them.
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from src.query_filters import filter_for_query
+from src.rag_engine import RAGEngine, RETRIEVAL_MODES
+
+SYLLABLES = ["ka", "lo", "mi", "ven", "tor", "qua", "zel", "rin", "bo", "dax", "pel", "sur", "nim", "hal", "jo", "wex"]
+RESOLUTIONS = ["720p", "1080p", "1440p", "4K"]
+SUPPORT = ["Standard", "Priority", "24/7 Priority", "Dedicated"]
+
+
+def _names(rng, count, taken):
+    names = []
+    while len(names) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(4)).capitalize()
+        if name not in taken:
+            taken.add(name)
+            names.append(name)
+    return names
+
+
+# Returns (markdown, json object, labelled queries); a query is (text, kind, fact).
+def build_kb(plans, platforms, services, seed):
+    rng = random.Random(seed)
+    taken = set()
+    plan_names, platform_names, service_names = (_names(rng, n, taken) for n in (plans, platforms, services))
+    md = ["# About Us", "We build automated video editing tools for content creators.", ""]
+    knowledge = {"company_info": {"mission": "Editing videos so creators do not have to."}, "pricing_features": {},
+                 "supported_platforms": [], "policies": {}, "services": []}
+    queries = []
+
+    md.append("# Pricing & Features")
+    for i, plan in enumerate(plan_names):
+        price, videos = f"${20 + 3 * i}/month", 5 + 7 * i
+        resolution, support = RESOLUTIONS[i % len(RESOLUTIONS)], SUPPORT[i % len(SUPPORT)]
+        platform = platform_names[i % len(platform_names)]
+        md += [f"## {plan} Plan", f"- {price}", f"- {videos} videos/month", f"- {resolution} resolution",
+               f"- {support} Support", f"- Publishing to {platform} included", ""]
+        knowledge["pricing_features"][f"{plan.lower()}_plan"] = {
+            "price": price, "videos_per_month": videos, "resolution": resolution, "support": support}
+        queries.append((f"how much does the {plan} plan cost", "pricing", price))
+        queries.append((f"how many videos per month on {plan}", "pricing", f"{videos} videos"))
+
+    md.append("# Supported Platforms")
+    for j, platform in enumerate(platform_names):
+        plan = plan_names[j % len(plan_names)]
+        minutes = 5 + j
+        md += [f"## {platform}", f"- {platform} publishing is included in the {plan} plan",
+               f"- {platform} sync runs every {minutes} minutes", ""]
+        knowledge["supported_platforms"].append(platform)
+        queries.append((f"how often does the {platform} platform sync", "platforms", f"every {minutes} minutes"))
+
+    md.append("# Policies")
+    for i, plan in enumerate(plan_names):
+        days = 3 + i
+        md += [f"## {plan} Refund Policy", f"- {plan} plan refunds are accepted within {days} days of purchase",
+               f"- {plan} costs ${20 + 3 * i}/month and renews monthly", ""]
+        knowledge["policies"][f"{plan.lower()}_refund_policy"] = f"Refunds within {days} days"
+        queries.append((f"what is the refund window for {plan}", "policies", f"within {days} days"))
+
+    md.append("# Our Services")
+    for k, service in enumerate(service_names):
+        plan, clip = plan_names[k % len(plan_names)], 2 + k
+        md += [f"## {service}", f"- {service} edits clips up to {clip} minutes long",
+               f"- {service} is included in the {plan} plan and exports at {RESOLUTIONS[k % len(RESOLUTIONS)]}", ""]
+        knowledge["services"].append(f"{service} (clips up to {clip} minutes)")
+        queries.append((f"what does the {service} feature do", "services", f"up to {clip} minutes"))
+
+    rng.shuffle(queries)
+    return "\n".join(md), knowledge, queries
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(engine, queries, mode, top_k, filtered, repeat):
+    latencies, precision, found, fallbacks = [], [], 0, 0
+    for query, kind, fact in queries:
+        where = filter_for_query(query) if filtered else None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = engine.search(query, top_k=top_k, mode=mode, where=where)
+            if where and not hits:
+                hits = engine.search(query, top_k=top_k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+        fallbacks += bool(where) and not engine.search(query, top_k=top_k, mode=mode, where=where)
+        precision.append(sum(hit["metadata"].get("kind") == kind for hit in hits) / top_k)
+        found += any(fact.lower() in hit["document"].lower() for hit in hits)
+    return statistics.mean(precision), found / len(queries), _percentile(latencies, 0.5), \
+        _percentile(latencies, 0.99), fallbacks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plans", type=int, default=40)
+    parser.add_argument("--platforms", type=int, default=80)
+    parser.add_argument("--services", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=300, help="Labelled queries sampled from the generated KB.")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-chunk-chars", type=int, default=800)
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy"])
+    parser.add_argument("--modes", default=",".join(RETRIEVAL_MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    markdown, knowledge, queries = build_kb(args.plans, args.platforms, args.services, args.seed)
+    queries = queries[:args.queries]
+    with tempfile.TemporaryDirectory() as root:
+        md_path, json_path = os.path.join(root, "kb.md"), os.path.join(root, "kb.json")
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(markdown)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(knowledge, f)
+        # Result caching is off so repeated queries measure the search itself.
+        engine = RAGEngine(md_path=md_path, json_path=json_path, db_path=os.path.join(root, "index"),
+                           backend=args.backend, cache_results=False, max_chunk_chars=args.max_chunk_chars)
+        start = time.perf_counter()
+        engine.warm()
+        warm_s = time.perf_counter() - start
+        # Encode every query once, so the timings compare searches rather than the model.
+        engine.embed_queries([query for query, _, _ in queries])
+
+        covered = sum(filter_for_query(query) is not None for query, _, _ in queries)
+        print(f"{engine.chunk_count} chunks ({args.plans} plans, {args.platforms} platforms, {args.services} services), "
+              f"{len(queries)} labelled queries, {covered / len(queries):.0%} filtered, {args.backend} store, "
+              f"indexed in {warm_s:.1f}s")
+        print(f"{'mode':<9}{'filter':<8}{'kind P@' + str(args.top_k):>10}{'fact hit':>10}{'p50 ms':>9}"
+              f"{'p99 ms':>9}{'fallbacks':>11}")
+        for mode in args.modes.split(","):
+            for filtered in (False, True):
+                precision, hit_rate, p50, p99, fallbacks = run(engine, queries, mode, args.top_k, filtered, args.repeat)
+                print(f"{mode:<9}{'on' if filtered else 'off':<8}{precision:>10.1%}{hit_rate:>10.1%}{p50:>9.2f}"
+                      f"{p99:>9.2f}{fallbacks:>11}")
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Accuracy/latency of the local intent classifier versus the LLM intent chain, and a sweep of the
+# classifier's threshold/margin. Run from the project root:  python -m benchmarks.intent_benchmark
+# Without a Gemini key the LLM rows run against the local stand-in model (src.stub_llm), so they
+# show the local + LLM pipeline offline but not Gemini's accuracy.
+import argparse
+import os
+import time
+import statistics
+from src.rag_engine import RAGEngine
+from src.chatbot_agent import AutoStreamAgent, Intent, INTENT_LABELS
+from src.stub_llm import StubChatModel
+
+# Held-out utterances (none of these appear in INTENT_EXAMPLES).
+EVAL_SET = [
+    ("hello!", "greeting"),
+    ("hey", "greeting"),
+    ("who am I talking to?", "greeting"),
+    ("what is autostream?", "greeting"),
+    ("good evening", "greeting"),
+    ("how much does pro cost?", "inquiry"),
+    ("what does the basic plan include", "inquiry"),
+    ("do you support instagram reels?", "inquiry"),
+    ("is there a refund if I cancel?", "inquiry"),
+    ("does basic have 4k?", "inquiry"),
+    ("what platforms are supported", "inquiry"),
+    ("is support available 24/7?", "inquiry"),
+    ("how many videos on basic", "inquiry"),
+    ("I want to buy the basic plan", "high_intent"),
+    ("sign me up for pro", "high_intent"),
+    ("I'd like to purchase a subscription", "high_intent"),
+    ("ready to get started with pro", "high_intent"),
+    ("let's do it, I'll take the pro plan", "high_intent"),
+    ("I want to start using it for my channel", "high_intent"),
+    # Purchase-sounding openers that are not purchases.
+    ("I want to start by asking about pricing", "inquiry"),
+    ("I'd like to start with a question about the pro plan", "inquiry"),
+    ("I'm ready to start comparing the plans", "inquiry"),
+    ("my name is Priya", "info_update"),
+    ("priya@example.com", "info_update"),
+    ("Snapchat", "info_update"),
+]
+
+
+def _expected(label):
+    return INTENT_LABELS.get(label, Intent.UNKNOWN)
+
+
+def _run(name, classify):
+    latencies, correct = [], 0
+    for text, label in EVAL_SET:
+        start = time.perf_counter()
+        predicted = classify(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += predicted == _expected(label)
+    print(f"{name:<18} accuracy={correct / len(EVAL_SET):.0%}  "
+          f"p50={statistics.median(latencies):.1f}ms  max={max(latencies):.1f}ms")
+
+
+# For each (threshold, margin): how many turns the classifier answers locally, how many of those
+# it gets right, and the accuracy of the whole pipeline when the rest go to the LLM.
+def sweep(classifier, llm_intents, thresholds, margins):
+    default = (classifier.threshold, classifier.margin)
+    print(f"{'threshold':>9}{'margin':>8}{'local':>8}{'local acc':>11}{'local + llm':>13}")
+    for threshold in thresholds:
+        for margin in margins:
+            classifier.threshold, classifier.margin = threshold, margin
+            local = correct_local = correct = 0
+            for text, label in EVAL_SET:
+                predicted, _ = classifier.classify(text)
+                if predicted is None:
+                    correct += llm_intents[text] == _expected(label)
+                    continue
+                hit = INTENT_LABELS.get(predicted, Intent.UNKNOWN) == _expected(label)
+                local += 1
+                correct_local += hit
+                correct += hit
+            marker = "  <- default" if (threshold, margin) == default else ""
+            local_acc = f"{correct_local / local:.0%}" if local else "-"
+            print(f"{threshold:>9.2f}{margin:>8.2f}{local:>5}/{len(EVAL_SET):<2}{local_acc:>11}"
+                  f"{correct / len(EVAL_SET):>13.0%}{marker}")
+    classifier.threshold, classifier.margin = default
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in model latency when no key is set.")
+    parser.add_argument("--thresholds", default="0.4,0.45,0.5,0.55,0.6")
+    parser.add_argument("--margins", default="0.0,0.03,0.05,0.08")
+    args = parser.parse_args()
+
+    try:
+        from api_key import GEMINI_API_KEY
+    except ImportError:
+        GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+    rag_engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path="chroma_db")
+    if GEMINI_API_KEY:
+        agent = AutoStreamAgent(api_key=GEMINI_API_KEY, rag_engine=rag_engine)
+        llm_name = "llm"
+    else:
+        print("No Gemini key configured; the LLM rows use the local stand-in model.")
+        agent = AutoStreamAgent(api_key="offline", rag_engine=rag_engine, llm=StubChatModel(latency=args.latency))
+        llm_name = "stub llm"
+    classifier = agent.intent_classifier
+    classifier.classify("warm up")
+    print(f"embedding model {rag_engine.model_name}, threshold={classifier.threshold}, margin={classifier.margin}")
+
+    local_hits = sum(classifier.classify(text)[0] is not None for text, _ in EVAL_SET)
+    print(f"local classifier answered {local_hits}/{len(EVAL_SET)} turns without the LLM")
+
+    def local_only(text):
+        label, _ = classifier.classify(text)
+        return INTENT_LABELS.get(label, Intent.UNKNOWN)
+
+    _run("local only", local_only)
+    _run(f"{llm_name} only", agent.identify_intent_llm)
+    _run(f"local + {llm_name}", agent.identify_intent)
+
+    print()
+    llm_intents = {text: agent.identify_intent_llm(text) for text, _ in EVAL_SET}
+    sweep(classifier, llm_intents, [float(t) for t in args.thresholds.split(",")],
+          [float(m) for m in args.margins.split(",")])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Sustained throughput and acknowledgement latency of the lead sink per fsync policy, plus
+# compaction/export cost and a crash test.
+# Run from the project root:  python -m benchmarks.lead_store_benchmark --leads 20000 --threads 8
+#                             python -m benchmarks.lead_store_benchmark --crash-test
+# The crash test SIGKILLs a writer process mid-stream and checks that every lead it saw
+# acknowledged is in the table after recovery.
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from src.lead_store import LeadStore, FSYNC_POLICIES
+
+
+def _lead(n, duplicate_every):
+    # Every duplicate_every-th lead repeats an earlier email with the same details.
+    if duplicate_every and n % duplicate_every == duplicate_every - 1:
+        n -= 1
+    return {"email": f"creator{n}@example.com", "name": f"Creator {n}", "platform": "YouTube"}
+
+
+def _run_threads(threads, target):
+    workers = [threading.Thread(target=target, args=(w,)) for w in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def sustained(policy, leads, threads, duplicate_every, latency_leads):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LeadStore(tmp, fsync=policy)
+        # Throughput: producers submit as fast as they can and the writer drains the backlog.
+        futures = [[] for _ in range(threads)]
+
+        def flood(worker):
+            futures[worker] = [store.submit(_lead(n, duplicate_every)) for n in range(worker, leads, threads)]
+
+        start = time.perf_counter()
+        _run_threads(threads, flood)
+        for worker in futures:
+            for future in worker:
+                future.result()
+        elapsed = time.perf_counter() - start
+        stats = store.stats()
+
+        # Acknowledgement latency: each producer waits for its lead before sending the next,
+        # like sessions finishing the lead funnel.
+        latencies = [[] for _ in range(threads)]
+
+        def closed_loop(worker):
+            for n in range(leads + worker, leads + latency_leads, threads):
+                submitted = time.perf_counter()
+                store.submit(_lead(n, 0)).result()
+                latencies[worker].append((time.perf_counter() - submitted) * 1000)
+
+        _run_threads(threads, closed_loop)
+
+        start = time.perf_counter()
+        store.compact()
+        compact_s = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = store.export(os.path.join(tmp, "leads.csv"))
+        export_s = time.perf_counter() - start
+        store.close()
+
+    acks = sorted(ms for worker in latencies for ms in worker)
+    print(f"{policy:<10}{leads / elapsed:>11.0f}{statistics.median(acks):>10.2f}{acks[int(len(acks) * 0.99) - 1]:>10.2f}"
+          f"{stats['avg_batch_size']:>11.1f}{stats['fsyncs']:>8}{stats['duplicates']:>7}{rows:>8}"
+          f"{compact_s * 1000:>11.0f}{export_s * 1000:>10.0f}")
+
+
+def crash_child(directory):
+    store = LeadStore(directory, fsync="batch")
+    acked = open(os.path.join(directory, "acked.txt"), "a", buffering=1)
+    n = 0
+    while True:
+        lead = _lead(n, 0)
+        store.submit(lead).add_done_callback(lambda f, email=lead["email"]: acked.write(email + "\n"))
+        n += 1
+        if n % 64 == 0:
+            time.sleep(0.001)
+
+
+def crash_test(seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        child = subprocess.Popen([sys.executable, "-m", "benchmarks.lead_store_benchmark", "--crash-child", tmp])
+        time.sleep(seconds)
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        # Only whole lines: the last acknowledgement may itself have been cut off by the kill.
+        with open(os.path.join(tmp, "acked.txt")) as f:
+            acknowledged = {line.strip() for line in f if line.endswith("\n")}
+        start = time.perf_counter()
+        store = LeadStore(tmp)
+        recovery_ms = (time.perf_counter() - start) * 1000
+        export_path = os.path.join(tmp, "leads.jsonl")
+        store.export(export_path, fmt="jsonl")
+        store.close()
+        with open(export_path) as f:
+            stored = {json.loads(line)["email"] for line in f}
+    lost = acknowledged - stored
+    print(f"killed after {seconds:g}s: {len(acknowledged)} leads acknowledged, {len(stored)} recovered "
+          f"in {recovery_ms:.0f} ms, {len(lost)} acknowledged leads lost")
+    return not lost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent producers (sessions capturing leads).")
+    parser.add_argument("--latency-leads", type=int, default=2000, help="Leads of the closed-loop latency test.")
+    parser.add_argument("--duplicate-every", type=int, default=10, help="Every Nth lead repeats an email; 0 for none.")
+    parser.add_argument("--policies", nargs="+", default=list(FSYNC_POLICIES), choices=FSYNC_POLICIES)
+    parser.add_argument("--crash-test", action="store_true")
+    parser.add_argument("--crash-after", type=float, default=1.0, help="Seconds before the writer is killed.")
+    parser.add_argument("--crash-child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.crash_child:
+        crash_child(args.crash_child)
+        return
+    if args.crash_test:
+        sys.exit(0 if crash_test(args.crash_after) else 1)
+
+    print(f"{args.leads} leads from {args.threads} threads")
+    print(f"{'fsync':<10}{'leads/s':>11}{'ack p50':>10}{'ack p99':>10}{'avg batch':>11}{'fsyncs':>8}{'dups':>7}"
+          f"{'rows':>8}{'compact ms':>11}{'export ms':>10}")
+    for policy in args.policies:
+        sustained(policy, args.leads, args.threads, args.duplicate_every, args.latency_leads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Calling a rate-limited, occasionally slow model directly versus through ResilientChatModel.
+# Run from the project root:  python -m benchmarks.llm_client_benchmark --clients 64 --requests 20
+# The stand-in model rejects calls beyond --quota-rps with a 429 (plus --error-rate random
+# 429s) and answers --tail-rate of the calls after --tail-latency seconds. A --duplicate-rate
+# share of the prompts repeats a few popular ones (short replies like "hi" or "yes" produce
+# identical intent prompts), which single flight can share.
+import argparse
+import asyncio
+import random
+import time
+from src.llm_client import ResilientChatModel
+from src.stub_llm import StubChatModel
+
+POPULAR = ["hi", "yes", "pricing?", "thanks", "sign me up"]
+
+
+def _prompts(clients, requests, duplicate_rate, seed):
+    rng = random.Random(seed)
+    return [[rng.choice(POPULAR) if rng.random() < duplicate_rate else f"question {client}-{i}"
+             for i in range(requests)] for client in range(clients)]
+
+
+async def run(model, prompts):
+    latencies, failures = [], 0
+
+    async def client(own):
+        nonlocal failures
+        for prompt in own:
+            start = time.perf_counter()
+            try:
+                await model.ainvoke(f'User Message: "{prompt}"\nClassification (output only the category name):')
+            except Exception:
+                failures += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(own) for own in prompts))
+    return latencies, failures, time.perf_counter() - start
+
+
+def _stub(args):
+    return StubChatModel(latency=args.latency, quota_rps=args.quota_rps, error_rate=args.error_rate,
+                         tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+
+
+def _report(name, latencies, failures, elapsed, stub, total):
+    latencies.sort()
+    pick = lambda fraction: latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] if latencies else 0.0
+    print(f"{name:<22}{(total - failures) / total:>8.1%}{total / elapsed:>8.1f}{pick(0.5):>9.0f}{pick(0.95):>9.0f}"
+          f"{pick(0.99):>9.0f}{stub.calls + stub.rate_limited:>10}{stub.rate_limited:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--quota-rps", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=2.0)
+    parser.add_argument("--rps", type=float, default=90, help="Client-side token bucket rate.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--hedge-ms", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    prompts = _prompts(args.clients, args.requests, args.duplicate_rate, args.seed)
+    total = args.clients * args.requests
+    print(f"{args.clients} clients x {args.requests} requests, quota {args.quota_rps:g} rps, "
+          f"{args.tail_rate:.0%} of calls take {args.tail_latency:g}s, {args.duplicate_rate:.0%} duplicate prompts")
+    print(f"{'':<22}{'success':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'upstream':>10}{'429s':>7}")
+
+    random.seed(args.seed)
+    stub = _stub(args)
+    _report("direct", *asyncio.run(run(stub, prompts)), stub, total)
+
+    variants = [
+        ("retries only", dict(requests_per_second=None, hedge_after=None, coalesce=False, max_concurrency=10_000)),
+        ("+ rate limit + cap", dict(hedge_after=None, coalesce=False)),
+        ("+ single flight", dict(hedge_after=None)),
+        ("+ hedging", dict()),
+    ]
+    for name, overrides in variants:
+        random.seed(args.seed)
+        stub = _stub(args)
+        options = dict(requests_per_second=args.rps, max_concurrency=args.concurrency, timeout=args.timeout,
+                       hedge_after=args.hedge_ms / 1000, coalesce=True)
+        options.update(overrides)
+        model = ResilientChatModel(inner=stub, **options)
+        _report(name, *asyncio.run(run(model, prompts)), stub, total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Concurrent-session load test for server.py against the local stand-in LLM.
+# Run from the project root:  python -m benchmarks.load_test --sessions 1 8 32 --latency 0.3
+# --error-rate and --quota-rps make the stand-in answer some calls with a 429, which the
+# agent's LLM client retries.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import aiohttp
+from aiohttp.test_utils import TestServer
+from server import build_agent, create_app
+
+CONVERSATION = [
+    "Tell me about your pricing plans.",
+    "Does the pro plan include AI captions?",
+    "I want to buy the pro plan",
+    "Jane Doe",
+    "jane@example.com",
+    "YouTube",
+]
+
+
+async def _session(client, base_url):
+    async with client.post(f"{base_url}/sessions") as resp:
+        session_id = (await resp.json())["session_id"]
+    for message in CONVERSATION:
+        async with client.post(f"{base_url}/sessions/{session_id}/messages", json={"message": message}) as resp:
+            resp.raise_for_status()
+            await resp.json()
+    return len(CONVERSATION)
+
+
+async def _run(concurrency, latency, stub_faults):
+    sessions_dir = tempfile.TemporaryDirectory()
+    agent = build_agent(stub_llm=True, stub_latency=latency, leads_dir=os.path.join(sessions_dir.name, "leads"),
+                        stub_faults=stub_faults)
+    server = TestServer(create_app(agent, sessions_db=os.path.join(sessions_dir.name, "sessions.db")))
+    await server.start_server()
+    base_url = str(server.make_url("")).rstrip("/")
+    try:
+        async with aiohttp.ClientSession() as client:
+            start = time.perf_counter()
+            turns = await asyncio.gather(*[_session(client, base_url) for _ in range(concurrency)])
+            elapsed = time.perf_counter() - start
+    finally:
+        await server.close()
+        agent.lead_store.close()
+        sessions_dir.cleanup()
+    total = sum(turns)
+    llm = agent.llm_client.stats()
+    print(f"sessions={concurrency:<4} turns={total:<5} elapsed={elapsed:6.2f}s  "
+          f"throughput={total / elapsed:7.1f} turns/s  llm_calls={agent.llm.calls}  "
+          f"429s={agent.llm.rate_limited}  retries={llm['retries']}  coalesced={llm['coalesced']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per stand-in LLM call.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stand-in calls failing with a 429.")
+    parser.add_argument("--quota-rps", type=float, default=None, help="Stand-in calls per second before 429s.")
+    args = parser.parse_args()
+    for concurrency in args.sessions:
+        asyncio.run(_run(concurrency, args.latency, {"error_rate": args.error_rate, "quota_rps": args.quota_rps}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Offline replay of scripted conversations against the local stand-in LLM, with JSON results
+# that can be diffed across commits. No Gemini key is needed.
+# Run from the project root:
+#   python -m benchmarks.replay_benchmark --latency 0.05 --repeat 5 --output replay.json
+#   python -m benchmarks.replay_benchmark --replay requests.jsonl --baseline replay.json
+# --replay takes JSONL: a line with "turns" (a list of messages) is one conversation; any
+# other line ({"message"}, {"body"}, {"title"}, as in requests.jsonl) is a one-turn conversation.
+# --canned takes a JSON object {regex: response} of fixed LLM outputs.
+import argparse
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+from src.chatbot_agent import AutoStreamAgent
+from src.rag_engine import RAGEngine
+from src.stub_llm import StubChatModel
+from src.tracing import tracer
+from src.turn_driver import TurnDriver
+
+SCRIPTS = {
+    "greeting": [
+        "hello!",
+        "who are you?",
+    ],
+    "inquiries": [
+        "Tell me about your pricing plans.",
+        "Does the pro plan include AI captions?",
+        "What is the refund policy?",
+        "Does basic include 4K?",
+        "Do you support Twitch?",
+    ],
+    "lead_funnel": [
+        "I want to buy the pro plan",
+        "Jane Doe",
+        "jane@example.com",
+        "YouTube",
+    ],
+    "lead_funnel_with_questions": [
+        "How much is the pro plan?",
+        "sign me up for pro",
+        "what do you need my name for?",
+        "Sam Lee",
+        "why do you need my email?",
+        "sam@example.com",
+        "is Instagram supported?",
+        "Instagram",
+    ],
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_conversations(path):
+    conversations = {}
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name = str(record.get("name") or record.get("request_id") or f"{path}:{n}")
+            if "turns" in record:
+                conversations[name] = list(record["turns"])
+            else:
+                text = record.get("message") or record.get("body") or record.get("title")
+                if text:
+                    conversations[name] = [text]
+    return conversations
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    summary = {"count": len(values), "mean": round(float(np.mean(values)), 2)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = round(float(value), 2)
+    return summary
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def replay(agent, conversations, repeat):
+    turns, nodes, per_conversation = [], {}, {}
+    for run in range(repeat):
+        # A fresh answer cache each run, so every run pays for the same LLM calls.
+        agent.answer_cache.clear()
+        for name, messages in conversations.items():
+            driver = TurnDriver(agent, f"replay-{run}-{name}")
+            driver.start()
+            for message in messages:
+                llm_calls, retrieval_ms = agent.llm.calls, agent.prompt_stats.retrieval_ms
+                driver.send(message)
+                turn = {
+                    "conversation": name,
+                    "wall_ms": driver.last_turn["wall_ms"],
+                    "llm_calls": agent.llm.calls - llm_calls,
+                    "retrieval_ms": agent.prompt_stats.retrieval_ms - retrieval_ms,
+                    "nodes": driver.last_turn["nodes"],
+                }
+                turns.append(turn)
+                per_conversation.setdefault(name, []).append(turn)
+                for node, ms in driver.last_turn["node_ms"]:
+                    nodes.setdefault(node, []).append(ms)
+    return turns, nodes, per_conversation
+
+
+def report(turns, nodes, per_conversation):
+    return {
+        "turns": {
+            "wall_ms": summarize([t["wall_ms"] for t in turns]),
+            "llm_calls": summarize([t["llm_calls"] for t in turns]),
+            "retrieval_ms": summarize([t["retrieval_ms"] for t in turns]),
+            "llm_calls_total": sum(t["llm_calls"] for t in turns),
+        },
+        "nodes": {node: summarize(values) for node, values in sorted(nodes.items())},
+        "conversations": {
+            name: {
+                "turns": len(conv_turns),
+                "wall_ms": summarize([t["wall_ms"] for t in conv_turns]),
+                "llm_calls": sum(t["llm_calls"] for t in conv_turns),
+            }
+            for name, conv_turns in per_conversation.items()
+        },
+    }
+
+
+def _print(results, baseline=None):
+    def row(name, summary, base):
+        line = f"{name:<34}{summary['count']:>7}" + "".join(f"{summary[f'p{p}']:>10.1f}" for p in PERCENTILES)
+        if base and base.get("count"):
+            line += f"   p50 {summary['p50'] - base['p50']:+.1f} ms"
+        return line
+
+    base = baseline or {}
+    print(f"{'':<34}{'count':>7}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    print(row("turn", results["turns"]["wall_ms"], base.get("turns", {}).get("wall_ms")))
+    print(row("retrieval per turn", results["turns"]["retrieval_ms"], base.get("turns", {}).get("retrieval_ms")))
+    for node, summary in results["nodes"].items():
+        print(row(f"node {node}", summary, base.get("nodes", {}).get(node)))
+    llm = results["turns"]["llm_calls"]
+    print(f"LLM calls per turn: mean {llm['mean']:.2f}, p99 {llm['p99']:.0f}, "
+          f"total {results['turns']['llm_calls_total']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per stand-in LLM call.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--replay", action="append", default=[], help="JSONL file of conversations (repeatable).")
+    parser.add_argument("--no-scripts", action="store_true", help="Only replay the --replay files.")
+    parser.add_argument("--canned", help="JSON file of {regex: response} LLM outputs.")
+    parser.add_argument("--retrieval-mode", default="dense")
+    parser.add_argument("--trace", action="store_true", help="Run with tracing enabled, to measure its overhead.")
+    parser.add_argument("--trace-file", help="Also write the spans to this JSONL file (implies --trace).")
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    conversations = {} if args.no_scripts else dict(SCRIPTS)
+    for path in args.replay:
+        conversations.update(load_conversations(path))
+    canned = {}
+    if args.canned:
+        with open(args.canned) as f:
+            canned = json.load(f)
+
+    rag_engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path="chroma_db",
+                           retrieval_mode=args.retrieval_mode)
+    rag_engine.warm()
+    agent = AutoStreamAgent(api_key="offline", rag_engine=rag_engine,
+                            llm=StubChatModel(latency=args.latency, canned=canned))
+
+    if args.trace or args.trace_file:
+        tracer.configure(enabled=True, jsonl_path=args.trace_file)
+    start = time.perf_counter()
+    turns, nodes, per_conversation = replay(agent, conversations, args.repeat)
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "latency_s": args.latency,
+            "repeat": args.repeat,
+            "retrieval_mode": args.retrieval_mode,
+            "tracing": tracer.enabled,
+            "conversations": len(conversations),
+            "elapsed_s": round(time.perf_counter() - start, 2),
+        },
+        **report(turns, nodes, per_conversation),
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
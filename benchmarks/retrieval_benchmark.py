@@ -0,0 +1,88 @@
+# Recall and latency of dense, lexical (BM25) and hybrid retrieval on the source-of-truth files.
+# Run from the project root:  python -m benchmarks.retrieval_benchmark --top-k 3
+# Every query is labelled with phrases that only the relevant chunks contain; a query counts
+# as recalled when any of its top-k chunks contains one of them. Query embedding and result
+# caches are disabled so every dense lookup pays for encoding the query.
+import argparse
+import statistics
+import time
+from src.rag_engine import RAGEngine, RETRIEVAL_MODES
+
+LABELLED_QUERIES = [
+    # Exact-term lookups.
+    ("4K", ["4k"]),
+    ("refund", ["no refunds after 7 days"]),
+    ("Twitch", ["twitch"]),
+    ("$79", ["$79"]),
+    ("$29", ["$29"]),
+    ("720p", ["720p"]),
+    ("Snapchat spotlight", ["snapchat"]),
+    ("pro plan price", ["$79"]),
+    ("basic plan", ["$29"]),
+    ("ServiceHive", ["servicehive"]),
+    # Paraphrases that share few or no words with the source text.
+    ("can I get my money back?", ["no refunds after 7 days"]),
+    ("how much does the cheapest option cost", ["$29"]),
+    ("which social networks do you work with", ["tiktok"]),
+    ("is customer support available around the clock", ["24/7"]),
+    ("who makes this product", ["servicehive"]),
+    ("can I export in ultra high definition", ["4k"]),
+    ("automatic subtitles for my clips", ["ai captions"]),
+    ("how many videos can I make on the basic plan", ["10 videos/month", "videos_per_month: 10"]),
+    ("do you handle short vertical videos from youtube", ["shorts"]),
+    ("what is the company's mission", ["qualified business leads"]),
+]
+
+
+def _rank_of_first_hit(documents, phrases):
+    for rank, document in enumerate(documents, start=1):
+        if any(phrase in document.lower() for phrase in phrases):
+            return rank
+    return None
+
+
+def run_mode(engine, mode, top_k, repeat):
+    before = engine.cache_stats()["retrieval_routes"].get("lexical_short_circuit", 0)
+    latencies, recalled, reciprocal_ranks = [], 0, []
+    for query, phrases in LABELLED_QUERIES:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            documents = engine.retrieve(query, top_k=top_k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+        rank = _rank_of_first_hit(documents, phrases)
+        recalled += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    short_circuits = engine.cache_stats()["retrieval_routes"].get("lexical_short_circuit", 0) - before
+    latencies.sort()
+    return {
+        "recall": recalled / len(LABELLED_QUERIES),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "short_circuit": short_circuits / (len(LABELLED_QUERIES) * repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db-path", default="chroma_db")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path=args.db_path,
+                       backend=args.backend, query_cache_size=0, cache_results=False)
+    engine.warm()
+
+    print(f"{len(LABELLED_QUERIES)} labelled queries, top_k={args.top_k}")
+    print(f"{'mode':<10}{'recall':>8}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}{'no encode':>11}")
+    for mode in RETRIEVAL_MODES:
+        stats = run_mode(engine, mode, args.top_k, args.repeat)
+        no_encode = 1.0 if mode == "lexical" else stats["short_circuit"]
+        print(f"{mode:<10}{stats['recall']:>8.0%}{stats['mrr']:>7.2f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{no_encode:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
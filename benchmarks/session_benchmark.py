@@ -0,0 +1,110 @@
+# Per-turn cost and storage of checkpointed sessions, against the local stand-in LLM.
+# Run from the project root:  python -m benchmarks.session_benchmark --turns 500 --sessions 1000
+# A long conversation should keep a flat per-turn latency and a bounded checkpoint, and idle
+# sessions should cost disk, not process memory.
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from langgraph.checkpoint.sqlite import SqliteSaver
+from src.chatbot_agent import AutoStreamAgent, checkpoint_serde
+from src.rag_engine import RAGEngine
+from src.stub_llm import StubChatModel
+from src.turn_driver import TurnDriver
+
+QUESTIONS = [
+    "How much is the pro plan?",
+    "Do you support Twitch?",
+    "What is the refund policy?",
+    "Does basic include 4K?",
+]
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _latest_checkpoint_bytes(db_path, thread_id):
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT length(checkpoint) FROM checkpoints WHERE thread_id = ? "
+                           "ORDER BY checkpoint_id DESC LIMIT 1", (thread_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def _stored_rows(db_path, thread_id):
+    with sqlite3.connect(db_path) as conn:
+        return tuple(conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+                     for table in ("checkpoints", "writes"))
+
+
+def long_session(agent, db_path, turns):
+    driver = TurnDriver(agent, "long")
+    driver.start()
+    latencies, sizes = [], []
+    for i in range(turns):
+        start = time.perf_counter()
+        driver.send(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+        if i in (0, turns - 1):
+            sizes.append(_latest_checkpoint_bytes(db_path, driver.thread_id))
+    window = max(1, min(50, turns // 2))
+    print(f"one session, {turns} turns:")
+    print(f"  turn latency p50  first {window}: {statistics.median(latencies[:window]):6.1f} ms   "
+          f"last {window}: {statistics.median(latencies[-window:]):6.1f} ms")
+    print(f"  checkpoint size   after turn 1: {sizes[0]} B   after turn {turns}: {sizes[-1]} B")
+    print(f"  messages in state after turn {turns}: {len(driver.state['messages'])}")
+    # Superseded checkpoints are pruned after every turn, so the file stops growing.
+    checkpoints, writes = _stored_rows(db_path, driver.thread_id)
+    print(f"  stored: {checkpoints} checkpoint(s), {writes} pending write(s), "
+          f"sessions.db {os.path.getsize(db_path) / 1024:.0f} KiB")
+
+
+def many_sessions(agent, db_path, sessions):
+    rss_before = _rss_mb()
+    db_before = os.path.getsize(db_path)
+    start = time.perf_counter()
+    for n in range(sessions):
+        driver = TurnDriver(agent, f"idle-{n}")
+        driver.start()
+        driver.send(QUESTIONS[n % len(QUESTIONS)])
+    elapsed = time.perf_counter() - start
+    agent.checkpointer.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_growth = os.path.getsize(db_path) - db_before
+    print(f"{sessions} idle sessions (greeting + one turn each) in {elapsed:.1f}s:")
+    print(f"  on disk: {db_growth / sessions / 1024:.1f} KiB per session   "
+          f"process RSS growth: {_rss_mb() - rss_before:.1f} MB")
+    # Resuming a session after a restart is a fresh saver reading the same file.
+    resumed = AutoStreamAgent(api_key="offline", rag_engine=agent.rag_engine, llm=agent.llm,
+                              checkpointer=SqliteSaver(sqlite3.connect(db_path, check_same_thread=False),
+                                                       serde=checkpoint_serde()))
+    driver = TurnDriver(resumed, f"idle-{sessions // 2}")
+    start = time.perf_counter()
+    driver.send("And the basic plan?")
+    print(f"  resumed turn on a new saver: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{len(driver.state['messages'])} messages in state")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    rag_engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path="chroma_db")
+    rag_engine.warm()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "sessions.db")
+        checkpointer = SqliteSaver(sqlite3.connect(db_path, check_same_thread=False), serde=checkpoint_serde())
+        agent = AutoStreamAgent(api_key="offline", rag_engine=rag_engine, llm=StubChatModel(), checkpointer=checkpointer)
+        long_session(agent, db_path, args.turns)
+        many_sessions(agent, db_path, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Time-to-first-prompt for the terminal entry point.
+# Run from the project root:  python -m benchmarks.startup_benchmark --runs 5
+# Measures how long `python main.py` takes to print the greeting and the "User: " prompt,
+# and how long importing main.py itself takes.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROMPT = b"User: "
+
+
+def time_to_first_prompt(timeout):
+    env = {**os.environ, "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "benchmark-placeholder")}
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, env=env)
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = proc.stdout.read1(1024)
+            if not chunk or time.perf_counter() - start > timeout:
+                raise RuntimeError(f"main.py exited or stalled before prompting: {output!r}")
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def import_time():
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    prompts = [time_to_first_prompt(args.timeout) for _ in range(args.runs)]
+    print(f"import main:          median={statistics.median(imports) * 1000:7.0f} ms  max={max(imports) * 1000:7.0f} ms")
+    print(f"time to first prompt: median={statistics.median(prompts) * 1000:7.0f} ms  max={max(prompts) * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
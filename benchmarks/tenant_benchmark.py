@@ -0,0 +1,104 @@
+# Serving many tenants' knowledge bases from one process: a skewed (Zipf) stream of requests
+# over --tenants synthetic tenants with at most --max-tenants indexes loaded at a time.
+# Run from the project root:  python -m benchmarks.tenant_benchmark --tenants 24 --max-tenants 6
+# Every tenant is a copy of the source-of-truth files with its own product name and prices,
+# so each request also checks that it was answered from its own tenant's index.
+import argparse
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+from src.tenants import TenantRegistry
+
+QUERY = "how much does the pro plan cost"
+
+
+def write_tenants(root, count):
+    with open("source_of_truth.md", encoding="utf-8") as f:
+        markdown = f.read()
+    with open("source_of_truth.json", encoding="utf-8") as f:
+        knowledge = f.read()
+    for i in range(count):
+        directory = os.path.join(root, f"tenant{i}")
+        os.makedirs(directory)
+        for name, text in (("source_of_truth.md", markdown), ("source_of_truth.json", knowledge)):
+            text = text.replace("AutoStream", f"Product{i}").replace("$79", f"${100 + i}").replace("$29", f"${30 + i}")
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write(text)
+
+
+def zipf_stream(count, requests, skew, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** skew for rank in range(count)]
+    tenants = [f"tenant{i}" for i in range(count)]
+    rng.shuffle(tenants)
+    return rng.choices(tenants, weights=weights, k=requests)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def _totals(stats):
+    per_tenant = stats["tenants"].values()
+    return sum(metrics["loads"] for metrics in per_tenant), sum(metrics["evictions"] for metrics in per_tenant)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=24)
+    parser.add_argument("--max-tenants", type=int, default=6)
+    parser.add_argument("--max-resident-chunks", type=int, default=None)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy"])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_tenants(root, args.tenants)
+        registry = TenantRegistry(root, max_tenants=args.max_tenants, max_resident_chunks=args.max_resident_chunks,
+                                  model_name=args.model, backend=args.backend)
+        start = time.perf_counter()
+        registry.get_model()
+        model_s = time.perf_counter() - start
+        # Build every index once, so the stream measures reloading an evicted tenant from disk
+        # rather than first-time embedding.
+        start = time.perf_counter()
+        for tenant_id in registry.tenants():
+            with registry.lease(tenant_id) as engine:
+                engine.search(QUERY, top_k=1)
+        build_s = time.perf_counter() - start
+        registry.close()
+        before = _totals(registry.stats())
+
+        hot, cold, misrouted = [], [], 0
+        for tenant_id in zipf_stream(args.tenants, args.requests, args.skew, args.seed):
+            resident = tenant_id in registry.stats()["resident"]
+            start = time.perf_counter()
+            with registry.lease(tenant_id) as engine:
+                hits = engine.search(QUERY, top_k=1)
+            (hot if resident else cold).append((time.perf_counter() - start) * 1000)
+            price = f"${100 + int(tenant_id[len('tenant'):])}"
+            misrouted += not hits or price not in hits[0]["document"]
+        stats = registry.stats()
+        registry.close()
+
+    loads, evictions = (after - earlier for after, earlier in zip(_totals(stats), before))
+    print(f"{args.tenants} tenants, at most {args.max_tenants} loaded, {args.requests} requests (Zipf {args.skew:g}), "
+          f"{args.backend} store")
+    print(f"shared model load {model_s:.2f}s, first-time index build of all tenants {build_s:.2f}s")
+    print(f"{'':<18}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'resident tenant':<18}{len(hot):>10}{statistics.median(hot) if hot else 0:>10.2f}{_percentile(hot, 0.99):>10.2f}")
+    print(f"{'cold tenant':<18}{len(cold):>10}{statistics.median(cold) if cold else 0:>10.2f}{_percentile(cold, 0.99):>10.2f}")
+    print(f"hit rate {len(hot) / args.requests:.1%}, {loads} loads, {evictions} evictions, "
+          f"{stats['resident_chunks']} chunks resident at the end, {misrouted} misrouted answers, "
+          f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
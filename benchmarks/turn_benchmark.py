@@ -0,0 +1,52 @@
+# Graph executions, node executions and wall time per user turn, against the local stand-in LLM.
+# Run from the project root:  python -m benchmarks.turn_benchmark --latency 0.05 --repeat 5
+# Every turn should be exactly one graph execution, including the replies to lead questions.
+import argparse
+import statistics
+from src.chatbot_agent import AutoStreamAgent
+from src.rag_engine import RAGEngine
+from src.stub_llm import StubChatModel
+from src.turn_driver import TurnDriver
+
+CONVERSATION = [
+    "Tell me about your pricing plans.",
+    "Does the pro plan include AI captions?",
+    "I want to buy the pro plan",
+    "Jane Doe",
+    "why do you need my email?",
+    "jane@example.com",
+    "YouTube",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per stand-in LLM call.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rag_engine = RAGEngine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path="chroma_db")
+    rag_engine.warm()
+    agent = AutoStreamAgent(api_key="offline", rag_engine=rag_engine, llm=StubChatModel(latency=args.latency))
+
+    per_turn = [[] for _ in CONVERSATION]
+    for run in range(args.repeat):
+        # A fresh answer cache each run, so every run pays for the same LLM calls.
+        agent.answer_cache.clear()
+        driver = TurnDriver(agent, f"benchmark-{run}")
+        driver.start()
+        for i, message in enumerate(CONVERSATION):
+            driver.send(message)
+            per_turn[i].append(driver.last_turn)
+
+    print(f"{'turn':<42}{'graph runs':>11}{'nodes':>7}{'wall p50 ms':>13}")
+    for message, turns in zip(CONVERSATION, per_turn):
+        print(f"{message:<42}{turns[0]['graph_runs']:>11}{turns[0]['node_executions']:>7}"
+              f"{statistics.median(t['wall_ms'] for t in turns):>13.1f}   {' > '.join(turns[0]['nodes'])}")
+    total_nodes = sum(turns[0]['node_executions'] for turns in per_turn)
+    total_wall = sum(statistics.median(t['wall_ms'] for t in turns) for turns in per_turn)
+    print(f"{'conversation':<42}{len(CONVERSATION):>11}{total_nodes:>7}{total_wall:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Labelled replies to the lead questions, checked against the local validators (src.validators).
+# Run from the project root:  python -m benchmarks.validator_benchmark
+# A reply is expected to be answered locally (verdict and cleaned-up value) or left to the LLM
+# validator (None, None). Exits with status 1 when any reply is classified differently.
+import json
+import sys
+import time
+from src.validators import classify_reply
+
+# (field, reply, expected verdict, expected value)
+CASES = [
+    ("name", "Shivangi", "answering", "Shivangi"),
+    ("name", "my name is Priya Raman", "answering", "Priya Raman"),
+    ("name", "Jean-Luc Picard", "answering", "Jean-Luc Picard"),
+    ("name", "May Ann Lee", None, None),
+    ("name", "tell me more", None, None),
+    ("name", "not right now", None, None),
+    ("name", "what is the pro plan?", "questioning", None),
+    ("email", "jane.doe@example.com", "answering", "jane.doe@example.com"),
+    ("email", "it's jane@example.com", "answering", "jane@example.com"),
+    ("email", "I'd rather not share it", None, None),
+    ("platform", "YouTube", "answering", "YouTube"),
+    ("platform", "mostly instagram reels", "answering", "Instagram"),
+    ("platform", "Twitter / X", "answering", "Twitter"),
+    ("platform", "twitter/x", "answering", "Twitter"),
+    ("platform", "X", "answering", "X"),
+    ("platform", "x.", "answering", "X"),
+    # A stray "x" is not the platform X.
+    ("platform", "my email is will@x.com", None, None),
+    ("platform", "I post 2 x a week", None, None),
+    ("platform", "x marks the spot", None, None),
+    ("platform", "does it support twitch?", "questioning", None),
+]
+
+
+def main():
+    with open("source_of_truth.json", encoding="utf-8") as f:
+        platforms = json.load(f).get("supported_platforms", [])
+    failures, local = [], 0
+    start = time.perf_counter()
+    for field, reply, verdict, value in CASES:
+        got = classify_reply(field, reply, platforms)
+        local += got[0] is not None
+        if got != (verdict, value):
+            failures.append((field, reply, (verdict, value), got))
+    elapsed_us = (time.perf_counter() - start) / len(CASES) * 1e6
+    print(f"{len(CASES)} replies, {local} answered locally, {len(failures)} mismatched, {elapsed_us:.1f}us per reply")
+    for field, reply, expected, got in failures:
+        print(f"  {field:<9}{reply!r:<32} expected {expected}, got {got}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
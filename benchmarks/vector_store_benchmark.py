@@ -0,0 +1,116 @@
+# Query latency and memory of the vector-store backends at different index sizes.
+# Run from the project root:  python -m benchmarks.vector_store_benchmark --sizes 1000 100000 1000000
+# Each (backend, size) index is built in one subprocess and queried from a fresh one, so the
+# reported RSS is what a serving process pays to open the persisted index and search it.
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from src.vector_store import ChromaVectorStore, NumpyVectorStore
+
+DIM = 384
+MODEL = "benchmark"
+BACKENDS = ["chroma", "numpy-float32", "numpy-float16", "numpy-int8"]
+
+
+def _rss_mb(field="VmRSS"):
+    # RssAnon is private memory; memory-mapped index pages show up in RssFile and are shared.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _open(backend, path):
+    if backend == "chroma":
+        return ChromaVectorStore(path, "benchmark", MODEL)
+    return NumpyVectorStore(path, MODEL, dtype=backend.split("-", 1)[1])
+
+
+def _vectors(rng, n):
+    vectors = rng.standard_normal((n, DIM), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(backend, size, path):
+    store = _open(backend, path)
+    rng = np.random.default_rng(0)
+    batch = min(store.max_batch_size() or 50000, 50000)
+    start = time.perf_counter()
+    for offset in range(0, size, batch):
+        n = min(batch, size - offset)
+        ids = [f"chunk_{i}" for i in range(offset, offset + n)]
+        store.upsert(ids, _vectors(rng, n), [f"document {i}" for i in ids], [{"n": i} for i in range(offset, offset + n)])
+    store.commit()
+    return {"build_s": time.perf_counter() - start}
+
+
+def query(backend, path, queries, top_k):
+    rss_before = _rss_mb()
+    store = _open(backend, path)
+    rng = np.random.default_rng(1)
+    vectors = _vectors(rng, queries)
+    store.query(vectors[:1], top_k)
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        store.query([vector], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "rss_mb": _rss_mb(),
+        "rss_delta_mb": _rss_mb() - rss_before,
+        "anon_mb": _rss_mb("RssAnon"),
+    }
+
+
+def _worker(args):
+    if args.worker == "build":
+        result = build(args.backend, args.size, args.path)
+    else:
+        result = query(args.backend, args.path, args.queries, args.top_k)
+    print(json.dumps(result))
+
+
+def _spawn(*argv):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.vector_store_benchmark", *argv],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--worker", choices=["build", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        _worker(args)
+        return
+
+    print(f"{'backend':<15}{'chunks':>10}{'build s':>10}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>10}{'+index MB':>11}{'private MB':>12}")
+    for size in args.sizes:
+        for backend in args.backends:
+            with tempfile.TemporaryDirectory() as path:
+                built = _spawn("--worker", "build", "--backend", backend, "--size", str(size), "--path", path)
+                stats = _spawn("--worker", "query", "--backend", backend, "--path", path,
+                               "--queries", str(args.queries), "--top-k", str(args.top_k))
+            print(f"{backend:<15}{size:>10}{built['build_s']:>10.1f}{stats['p50_ms']:>10.2f}"
+                  f"{stats['p95_ms']:>10.2f}{stats['rss_mb']:>10.0f}{stats['rss_delta_mb']:>11.0f}"
+                  f"{stats['anon_mb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
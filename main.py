@@ -1,8 +1,9 @@
 import logging
 import os
-from src.rag_engine import RAGEngine
-from src.chatbot_agent import AutoStreamAgent
-from langgraph.graph import END
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.chatbot_agent import GREETING_MESSAGE
+from src.turn_driver import TurnDriver
 
 # Try to load API key from file or environment
 try:
@@ -13,45 +14,45 @@ except ImportError:
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 
+def load_agent():
+    # Heavy imports (torch, chromadb, the Gemini client) happen here, off the main thread.
+    from src.resources import get_agent, get_checkpointer, get_lead_store
+    return get_agent(GEMINI_API_KEY, checkpointer=get_checkpointer(), lead_store=get_lead_store())
+
 def main():
     if not GEMINI_API_KEY:
         print("Error: Gemini API key not found. Please set GOOGLE_API_KEY environment variable or create api_key.py.")
         return
 
-    # Initialize Engine and Agent
-    rag_engine = RAGEngine(
-        md_path="source_of_truth.md",
-        json_path="source_of_truth.json",
-        db_path="chroma_db"
-    )
-    
-    agent = AutoStreamAgent(api_key=GEMINI_API_KEY, rag_engine=rag_engine)
-    
-    # Initial State
-    state = {
-        'messages': [],
-        'intent': None,
-        'lead_captured': False,
-        'step': 'greetings',
-        'user_input': None,
-        'agent_response': None,
-        'lead_state': None,
-        'is_streamlit': False
-    }
-    
+    # Load the model, index and agent in the background while the user reads the greeting
+    # and types their first message.
+    preload = ThreadPoolExecutor(max_workers=1).submit(load_agent)
+
     print("--- AutoStream Chatbot (Terminal Mode) ---")
-    
-    while state.get('step') != END:
-        if state.get('step') == 'await_user':
+    print(f"Agent: {GREETING_MESSAGE}")
+
+    driver = None
+    try:
+        while driver is None or not driver.finished:
             user_input = input("User: ")
-            state['user_input'] = user_input
-            state['messages'].append({'role': 'user', 'content': user_input})
-            state['step'] = 'intent'
-        
-        state = agent.graph.invoke(state)
-        
-        if state.get('agent_response'):
-            print(f"Agent: {state['agent_response']}")
+            if driver is None:
+                # The session is checkpointed under this thread id; each turn sends only the new input.
+                driver = TurnDriver(preload.result(), uuid.uuid4().hex)
+            printed = []
+
+            def print_token(text):
+                if not printed:
+                    print("Agent: ", end="", flush=True)
+                printed.append(text)
+                print(text, end="", flush=True)
+
+            driver.send(user_input, print_token)
+            if printed:
+                print()
+    finally:
+        # A terminal session is never resumed (each run starts a new thread id).
+        if driver is not None:
+            driver.delete()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+import weakref
+from aiohttp import web, WSMsgType, ContentTypeError
+from src.chatbot_agent import checkpoint_serde
+from src.resources import get_agent, get_lead_store, get_tenant_registry
+from src.tracing import tracer
+from src.turn_driver import TurnDriver
+
+# Try to load API key from file or environment
+try:
+    from api_key import GEMINI_API_KEY
+except ImportError:
+    GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+logger = logging.getLogger(__name__)
+
+
+class SessionLocks:
+    # Session state lives in the agent's checkpointer; only sessions with a turn in flight
+    # hold a lock here, so idle sessions cost no memory.
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()
+
+    def __call__(self, session_id):
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    def __len__(self):
+        return len(self._locks)
+
+
+# The JSON object in a request body, or None when the body is not one.
+async def read_json(request):
+    try:
+        body = await request.json()
+    except (ValueError, ContentTypeError):
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def bad_request(error):
+    return web.json_response({"error": error}, status=400)
+
+
+async def run_turn(driver, message, on_token=lambda text: None):
+    # One graph execution: a new question, or the answer to a pending lead question.
+    response = await driver.asend(message, on_token)
+    return driver.state, [response] if response else []
+
+
+def create_app(agent, sessions_db="sessions.db"):
+    locks = SessionLocks()
+    routes = web.RouteTableDef()
+
+    async def open_checkpointer(app):
+        # Sessions are kept in SQLite, so they survive a restart of the server.
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        conn = await aiosqlite.connect(sessions_db)
+        agent.attach_checkpointer(AsyncSqliteSaver(conn, serde=checkpoint_serde()))
+        yield
+        await conn.close()
+
+    # Loads the session's current state (and whether it waits on a lead question).
+    async def load_or_404(driver):
+        if not await driver.aload():
+            raise web.HTTPNotFound(text="Unknown session")
+
+    # The optional body {"tenant": "<tenant id>"} picks the session's knowledge base.
+    @routes.post('/sessions')
+    async def create_session(request):
+        body = await read_json(request) if request.can_read_body else {}
+        if body is None:
+            return bad_request("Body must be a JSON object")
+        tenant_id = body.get("tenant")
+        if tenant_id is not None and (agent.tenants is None or not agent.tenants.has_tenant(tenant_id)):
+            raise web.HTTPNotFound(text="Unknown tenant")
+        driver = TurnDriver(agent, uuid.uuid4().hex, tenant_id)
+        async with locks(driver.thread_id):
+            greeting = await driver.astart()
+        return web.json_response({"session_id": driver.thread_id, "response": greeting})
+
+    @routes.post('/sessions/{session_id}/messages')
+    async def post_message(request):
+        driver = TurnDriver(agent, request.match_info['session_id'])
+        body = await read_json(request)
+        message = body.get("message", "") if body is not None else None
+        if not isinstance(message, str):
+            return bad_request('Body must be a JSON object with a "message" string')
+        # Turns of one session are serialized; different sessions run concurrently.
+        async with locks(driver.thread_id):
+            await load_or_404(driver)
+            state, responses = await run_turn(driver, message)
+        return web.json_response({"responses": responses, "step": state.get('step')})
+
+    @routes.delete('/sessions/{session_id}')
+    async def delete_session(request):
+        driver = TurnDriver(agent, request.match_info['session_id'])
+        async with locks(driver.thread_id):
+            await load_or_404(driver)
+            await driver.adelete()
+        return web.json_response({"deleted": driver.thread_id})
+
+    @routes.get('/sessions/{session_id}/ws')
+    async def websocket(request):
+        driver = TurnDriver(agent, request.match_info['session_id'])
+        await load_or_404(driver)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        loop = asyncio.get_running_loop()
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            tokens = asyncio.Queue()
+
+            async def forward():
+                while (text := await tokens.get()) is not None:
+                    await ws.send_json({"type": "token", "text": text})
+
+            sender = asyncio.create_task(forward())
+            try:
+                async with locks(driver.thread_id):
+                    # Another connection may have advanced the session since the last message.
+                    await driver.aload()
+                    state, responses = await run_turn(
+                        driver, msg.data,
+                        on_token=lambda text: loop.call_soon_threadsafe(tokens.put_nowait, text),
+                    )
+                reply = {"type": "done", "responses": responses, "step": state.get('step')}
+            except Exception as e:
+                # A failed turn is reported on the socket; the connection stays open for the next message.
+                logger.error(f"Turn failed for session {driver.thread_id}: {e!r}")
+                reply = {"type": "error", "error": str(e)}
+            finally:
+                # Queued behind any tokens still being scheduled from worker threads.
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+                await sender
+            await ws.send_json(reply)
+        return ws
+
+    @routes.get('/stats')
+    async def stats(request):
+        return web.json_response({"active_sessions": len(locks), "caches": agent.cache_stats()})
+
+    # Prometheus text exposition of the span metrics; empty histograms until tracing is on.
+    @routes.get('/metrics')
+    async def metrics(request):
+        return web.Response(text=tracer.prometheus_text(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.cleanup_ctx.append(open_checkpointer)
+    app.add_routes(routes)
+    return app
+
+
+def build_agent(stub_llm=False, stub_latency=0.0, micro_batch_ms=None, leads_dir="leads", tenants_dir=None,
+                max_tenants=8, max_resident_chunks=None, llm_options=None, stub_faults=None):
+    # One RAGEngine (or one per loaded tenant) and one compiled graph are shared by every session
+    # in the process.
+    llm = None
+    if stub_llm:
+        from src.stub_llm import StubChatModel
+        llm = StubChatModel(latency=stub_latency, **(stub_faults or {}))
+    lead_store = get_lead_store(leads_dir)
+    # With micro_batch_ms, retrievals of concurrent sessions are embedded and searched together.
+    if tenants_dir is None:
+        return get_agent(GEMINI_API_KEY, llm=llm, lead_store=lead_store, llm_options=llm_options,
+                         micro_batch_ms=micro_batch_ms)
+    tenants = get_tenant_registry(tenants_dir, max_tenants=max_tenants, max_resident_chunks=max_resident_chunks,
+                                  micro_batch_ms=micro_batch_ms)
+    # Sessions created without a tenant use the top-level knowledge base.
+    if not tenants.has_tenant(tenants.default_tenant):
+        tenants.register(tenants.default_tenant, "source_of_truth.md", "source_of_truth.json", "chroma_db")
+    return get_agent(GEMINI_API_KEY, llm=llm, lead_store=lead_store, tenants=tenants, llm_options=llm_options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the AutoStream agent over HTTP and WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--stub-llm", action="store_true", help="Use the local stand-in model instead of Gemini.")
+    parser.add_argument("--stub-latency", type=float, default=0.3, help="Seconds per stand-in LLM call.")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of stand-in calls failing with a 429.")
+    parser.add_argument("--stub-quota-rps", type=float, default=None,
+                        help="Stand-in calls beyond this many per second fail with a 429.")
+    parser.add_argument("--llm-rps", type=float, default=None, help="Upstream LLM calls per second (token bucket).")
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="Upstream LLM calls in flight at once.")
+    parser.add_argument("--llm-timeout", type=float, default=30.0, help="Seconds before an LLM attempt is retried.")
+    parser.add_argument("--llm-retries", type=int, default=3)
+    parser.add_argument("--llm-hedge-ms", type=float, default=None,
+                        help="Start a second attempt when the first has not answered after this many ms.")
+    parser.add_argument("--sessions-db", default="sessions.db", help="SQLite file holding conversation state.")
+    parser.add_argument("--leads-dir", default="leads", help="Directory of the captured-lead log and table.")
+    parser.add_argument("--micro-batch-ms", type=float, default=None,
+                        help="Coalesce concurrent retrievals arriving within this many ms into one batch.")
+    parser.add_argument("--tenants-dir", help="Serve one knowledge base per tenant from <dir>/<tenant>/ "
+                                              "(source_of_truth.md and .json).")
+    parser.add_argument("--max-tenants", type=int, default=8, help="Tenant indexes kept loaded at once.")
+    parser.add_argument("--max-resident-chunks", type=int, default=None,
+                        help="Also evict cold tenants once the loaded indexes hold more chunks than this.")
+    parser.add_argument("--trace", action="store_true", help="Record spans for every node and dependency call (see /metrics).")
+    parser.add_argument("--trace-file", help="Also append the spans to this JSONL file (implies --trace).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if not GEMINI_API_KEY and not args.stub_llm:
+        print("Error: Gemini API key not found. Please set GOOGLE_API_KEY environment variable or create api_key.py.")
+        return
+
+    if args.trace or args.trace_file:
+        tracer.configure(enabled=True, jsonl_path=args.trace_file)
+    agent = build_agent(stub_llm=args.stub_llm, stub_latency=args.stub_latency, micro_batch_ms=args.micro_batch_ms,
+                        leads_dir=args.leads_dir, tenants_dir=args.tenants_dir, max_tenants=args.max_tenants,
+                        max_resident_chunks=args.max_resident_chunks,
+                        llm_options={"requests_per_second": args.llm_rps, "max_concurrency": args.llm_concurrency,
+                                     "timeout": args.llm_timeout, "max_retries": args.llm_retries,
+                                     "hedge_after": args.llm_hedge_ms / 1000 if args.llm_hedge_ms else None},
+                        stub_faults={"error_rate": args.stub_error_rate, "quota_rps": args.stub_quota_rps})
+    web.run_app(create_app(agent, sessions_db=args.sessions_db), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
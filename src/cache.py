@@ -0,0 +1,99 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        # Seconds an entry stays valid; None keeps entries until they are evicted.
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Misses that waited for another caller's computation instead of repeating it.
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key)
+            return default if value is _MISSING else value
+
+    def _get_locked(self, key):
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return _MISSING
+
+    # Values for keys, calling compute(missing keys) -> values once for the keys that are
+    # neither cached nor already being computed. Keys another caller is computing are waited
+    # for, so concurrent misses on the same key compute it once.
+    def get_or_compute_many(self, keys, compute):
+        found, mine, theirs = {}, [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._get_locked(key)
+                if value is not _MISSING:
+                    found[key] = value
+                elif key in self._inflight:
+                    theirs[key] = self._inflight[key]
+                    self.coalesced += 1
+                else:
+                    self._inflight[key] = Future()
+                    mine.append(key)
+        if mine:
+            try:
+                values = list(compute(mine))
+            except BaseException as e:
+                with self._lock:
+                    for key in mine:
+                        self._inflight.pop(key).set_exception(e)
+                raise
+            for key, value in zip(mine, values):
+                self.put(key, value)
+                found[key] = value
+            with self._lock:
+                for key in mine:
+                    self._inflight.pop(key).set_result(found[key])
+        for key, future in theirs.items():
+            found[key] = future.result()
+        return [found[key] for key in keys]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
@@ -1,21 +1,167 @@
+import time
+import asyncio
 import logging
-from typing import Dict, Any, TypedDict, Optional, List
+import contextvars
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, Any, TypedDict, Optional, List, Annotated
 from enum import Enum
-from langgraph.graph import StateGraph, START, END
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from langgraph.constants import START, END
+from src.semantic_cache import SemanticCache
+from src.context_builder import ContextBuilder, PromptStats
+from src.intent_classifier import LocalIntentClassifier
+from src.query_filters import filter_for_query
+from src.validators import classify_reply
+from src.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Tag carried by the answer-generating chain so streamed tokens from the intent or
+# validation chains are not shown to the user.
+ANSWER_TAG = "agent_answer"
+
+GREETING_MESSAGE = "Hi! I'm your AutoStream assistant. How can I help you today?"
+
 class Intent(Enum):
     GREETING = "greeting"
     INQUIRY = "inquiry"
     HIGH_INTENT = "high_intent"
     UNKNOWN = "unknown"
 
+# Classifier labels to intents; "info_update" stays UNKNOWN, as with the LLM classifier.
+INTENT_LABELS = {
+    "greeting": Intent.GREETING,
+    "inquiry": Intent.INQUIRY,
+    "high_intent": Intent.HIGH_INTENT,
+}
+
+def _chunk_text(chunk):
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+def _parse_intent(prediction: str) -> Intent:
+    prediction = prediction.strip().lower()
+    if "high_intent" in prediction: return Intent.HIGH_INTENT
+    if "inquiry" in prediction: return Intent.INQUIRY
+    if "greeting" in prediction: return Intent.GREETING
+    return Intent.UNKNOWN
+
+def _traced_node(name, func, afunc=None):
+    # Every node runs inside a "node.<name>" span; the spans of the calls it makes nest under it.
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.errors import GraphBubbleUp
+
+    def run(state):
+        with tracer.span(f"node.{name}") as span:
+            try:
+                return func(state)
+            except GraphBubbleUp:
+                # interrupt() pausing the node for user input is not a failure.
+                span.mark("interrupted")
+                raise
+
+    async def arun(state):
+        with tracer.span(f"node.{name}") as span:
+            try:
+                return await afunc(state)
+            except GraphBubbleUp:
+                span.mark("interrupted")
+                raise
+
+    return RunnableLambda(run, afunc=arun if afunc is not None else None, name=name)
+
+def _log_lead_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Lead was not persisted: {future.exception()}")
+
+class _TokenRelay:
+    def __init__(self, on_token, on_node=None):
+        self.on_token = on_token
+        self.on_node = on_node
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.streamed = ""
+
+    def _emit(self, text):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            logger.info(f"Time to first token: {(self.first_token_at - self.start) * 1000:.0f} ms")
+        self.on_token(text)
+
+    # Returns the latest graph state for "values" events, None for token and node events.
+    def feed(self, mode, payload):
+        if mode == "values":
+            return payload
+        if mode == "updates":
+            if self.on_node is not None:
+                for node in payload:
+                    if node != "__interrupt__":
+                        self.on_node(node)
+            return None
+        chunk, metadata = payload
+        if ANSWER_TAG in (metadata.get("tags") or []):
+            text = _chunk_text(chunk)
+            if text:
+                self.streamed += text
+                self._emit(text)
+        return None
+
+    def finish(self, final_state):
+        response = final_state.get('agent_response') or ""
+        # Nodes may wrap the generated answer (e.g. re-asking a lead question after it).
+        if response.startswith(self.streamed):
+            remainder = response[len(self.streamed):]
+            if remainder:
+                self._emit(remainder)
+        logger.info(f"Turn completed in {(time.perf_counter() - self.start) * 1000:.0f} ms")
+        return final_state
+
+# Intents whose route answers from the knowledge base and can use prefetched context.
+CONTEXT_INTENTS = (Intent.GREETING, Intent.INQUIRY)
+
+# Lead fields in the order they are collected: (first ask, short re-ask after a clarifying question).
+LEAD_QUESTIONS = {
+    "name": ("Great! To get started, may I have your name?", "May I have your name?"),
+    "email": ("Thanks! Now, what is your email address?", "What is your email address?"),
+    "platform": ("Almost there! Which creator platform do you use (YouTube, Instagram, etc.)?", "Which platform do you use?"),
+}
+
+# Conversation history kept verbatim; older messages are folded into a short summary.
+HISTORY_WINDOW = 12
+SUMMARY_LINES = 10
+SUMMARY_HEADER = "Earlier in this conversation the user said:"
+
+def _fold_summary(summary: Optional[str], dropped: List[dict]) -> Optional[str]:
+    # Extractive on purpose: one line per earlier user message, newest kept, so folding
+    # never costs an LLM call.
+    lines = summary.split("\n")[1:] if summary else []
+    lines += [f"- {m['content'][:80]}" for m in dropped if m.get('role') == 'user']
+    lines = lines[-SUMMARY_LINES:]
+    return "\n".join([SUMMARY_HEADER] + lines) if lines else None
+
+def windowed_messages(existing: Optional[List[dict]], new: Optional[List[dict]]) -> List[dict]:
+    # Reducer for AgentState.messages: nodes and drivers return only the new messages. The
+    # result holds at most HISTORY_WINDOW messages, preceded by a system message summarizing
+    # the ones that fell out of the window.
+    messages = list(existing or []) + list(new or [])
+    summary = None
+    if messages and messages[0].get('role') == 'system':
+        summary = messages.pop(0)['content']
+    if len(messages) > HISTORY_WINDOW:
+        summary = _fold_summary(summary, messages[:-HISTORY_WINDOW])
+        messages = messages[-HISTORY_WINDOW:]
+    return ([{'role': 'system', 'content': summary}] if summary else []) + messages
+
+def checkpoint_serde():
+    # Checkpointers only deserialize types they were told about; AgentState holds an Intent.
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    return JsonPlusSerializer(allowed_msgpack_modules=[(Intent.__module__, Intent.__name__)])
+
 class AgentState(TypedDict):
-    messages: List[dict]
+    messages: Annotated[List[dict], windowed_messages]
     intent: Optional[Any]
     lead_name: Optional[str]
     lead_email: Optional[str]
@@ -25,28 +171,92 @@ class AgentState(TypedDict):
     user_input: Optional[str]
     agent_response: Optional[str]
     lead_state: Optional[Any]
-    asked_name: Optional[bool]
-    asked_email: Optional[bool]
-    asked_platform: Optional[bool]
-    is_streamlit: Optional[bool]
+    prefetched_context: Optional[str]
+    turn_timings: Optional[dict]
+    # Knowledge base the conversation is answered from (see TenantRegistry); None is the default.
+    tenant_id: Optional[str]
+
+def new_session_state(tenant_id: Optional[str] = None) -> AgentState:
+    return {
+        'tenant_id': tenant_id,
+        'messages': [],
+        'intent': None,
+        'lead_captured': False,
+        'step': 'greetings',
+        'user_input': None,
+        'agent_response': None,
+        'lead_state': None,
+    }
 
 class AutoStreamAgent:
-    def __init__(self, api_key, rag_engine):
+    def __init__(self, api_key, rag_engine, answer_cache_threshold=0.92, local_intent=True, llm=None,
+                 context_top_k=3, context_token_budget=250, checkpointer=None, lead_store=None, tenants=None,
+                 llm_options=None, filter_retrieval=True):
         self.api_key = api_key
         self.rag_engine = rag_engine
+        # With a TenantRegistry, each session's tenant_id picks its knowledge base and
+        # rag_engine is not used.
+        self.tenants = tenants
+        # Captured leads are handed to this LeadStore, which persists them off the response path.
+        self.lead_store = lead_store
+        # Retrieves context_top_k chunks and keeps what fits in context_token_budget after
+        # near-duplicates (e.g. the same plan in the .md and .json sources) are dropped.
+        self.context_top_k = context_top_k
+        self.context_builder = ContextBuilder(token_budget=context_token_budget)
+        # Questions that clearly name a topic (pricing, platforms, policies, ...) are searched
+        # only among chunks of that kind; see src.query_filters.
+        self.filter_retrieval = filter_retrieval
+        self.prompt_stats = PromptStats()
+        self.answer_cache = SemanticCache(threshold=answer_cache_threshold)
+        # Confident local predictions skip the intent LLM call; set local_intent=False to always ask the LLM.
+        # It only needs the embedding model, which the registry shares across tenants.
+        self.intent_classifier = LocalIntentClassifier(tenants or rag_engine) if local_intent else None
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
         
-        # Initialize LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=self.api_key,
-            temperature=0
-        )
+        # Every chain calls the model through one ResilientChatModel (rate limit, concurrency
+        # cap, timeouts and retries, coalescing of identical in-flight prompts); llm_options
+        # configures it.
+        from src.llm_client import ResilientChatModel
+        llm_options = llm_options or {}
+
+        # Initialize LLM (a stand-in chat model can be passed for offline runs and load tests)
+        if llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            # Retries and timeouts belong to the ResilientChatModel alone: the SDK makes a single
+            # attempt, and its HTTP request is bounded by the same per-attempt timeout.
+            llm = ChatGoogleGenerativeAI(
+                model="gemini-2.0-flash",
+                google_api_key=self.api_key,
+                temperature=0,
+                max_retries=0,
+                timeout=llm_options.get("timeout", ResilientChatModel.model_fields["timeout"].default),
+            )
+        self.llm = llm
+        self.llm_client = llm if isinstance(llm, ResilientChatModel) else ResilientChatModel(inner=llm, **llm_options)
         
         # Build components
         self._setup_chains()
-        self.graph = self._build_graph()
+        self.attach_checkpointer(checkpointer)
+
+    # Sessions live in the checkpointer under a thread id: callers pass only the new input for
+    # a turn and the rest of the state is loaded from (and written back to) the store. Lead
+    # questions pause the graph with interrupt(), which needs one; without a persistent
+    # checkpointer, sessions are kept in memory.
+    def attach_checkpointer(self, checkpointer):
+        if checkpointer is None:
+            from langgraph.checkpoint.memory import InMemorySaver
+            checkpointer = InMemorySaver(serde=checkpoint_serde())
+        self.checkpointer = checkpointer
+        self.graph = self._build_graph(checkpointer)
+
+    @staticmethod
+    def session_config(thread_id: str):
+        return {"configurable": {"thread_id": thread_id}}
 
     def _setup_chains(self):
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
         # Intent Classification Chain
         intent_prompt = PromptTemplate.from_template("""
 Analyze the following user message and classify its intent.
@@ -60,7 +270,7 @@ User Message: "{user_input}"
 
 Classification (output only the category name):
 """)
-        self.intent_chain = intent_prompt | self.llm | StrOutputParser()
+        self.intent_chain = intent_prompt | self.llm_client | StrOutputParser()
 
         # Input Validation Chain (to distinguish between info and questions)
         validation_prompt = PromptTemplate.from_template("""
@@ -73,7 +283,7 @@ Is the user:
 
 Output only the word "answering" or "questioning".
 """)
-        self.validation_chain = validation_prompt | self.llm | StrOutputParser()
+        self.validation_chain = validation_prompt | self.llm_client | StrOutputParser()
 
         # RAG Chain
         rag_prompt = PromptTemplate.from_template("""
@@ -92,150 +302,364 @@ Question: {question}
 
 Answer:
 """)
-        self.rag_chain = rag_prompt | self.llm | StrOutputParser()
+        self.rag_prompt = rag_prompt
+        self.rag_chain = (rag_prompt | self.llm_client | StrOutputParser()).with_config(tags=[ANSWER_TAG])
+
+    # The engine to answer from, held for the duration of the with block: with a
+    # TenantRegistry that is a lease, so the tenant is not closed while it is being searched.
+    def engine_for(self, tenant_id: Optional[str] = None):
+        if self.tenants is not None:
+            return self.tenants.lease(tenant_id)
+        return nullcontext(self.rag_engine)
+
+    # engine_for() for coroutines: a cold tenant is loaded in a worker thread.
+    @asynccontextmanager
+    async def aengine_for(self, tenant_id: Optional[str] = None):
+        if self.tenants is None:
+            yield self.rag_engine
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.tenants.acquire, tenant_id))
+        try:
+            engine = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The load still finishes in its thread; give the lease back when it does.
+            acquiring.add_done_callback(
+                lambda done: done.cancelled() or done.exception() or self.tenants.release(done.result()))
+            raise
+        try:
+            yield engine
+        finally:
+            # The last release of an evicted engine closes it, which joins its micro-batcher thread.
+            # The release runs to completion in its thread even if this task is cancelled.
+            await asyncio.to_thread(self.tenants.release, engine)
+
+    def _retrieve_context(self, question: str, tenant_id: Optional[str] = None) -> str:
+        start = time.perf_counter()
+        where = filter_for_query(question) if self.filter_retrieval else None
+        with self.engine_for(tenant_id) as engine:
+            hits = engine.search(question, top_k=self.context_top_k, where=where)
+            fallback = bool(where) and not hits
+            if fallback:
+                # The filter guessed wrong (or the knowledge base has no such chunks): search everything.
+                hits = engine.search(question, top_k=self.context_top_k)
+        retrieval_ms = (time.perf_counter() - start) * 1000
+        with tracer.span("rag.context") as span:
+            context, stats = self.context_builder.build(hits)
+            span.set(**stats, filtered=bool(where), filter_fallback=fallback)
+        stats.update(retrieval_ms=retrieval_ms, filtered=bool(where), filter_fallback=fallback)
+        self.prompt_stats.record_context(stats)
+        return context
+
+    def _record_rag_prompt(self, context: str, question: str):
+        prompt = self.rag_prompt.format(context=context, question=question)
+        prompt_tokens = self.context_builder.count_tokens(prompt)
+        self.prompt_stats.record_prompt(prompt_tokens)
+        return prompt_tokens
+
+    def _timed_retrieve_context(self, question: str, tenant_id: Optional[str] = None):
+        start = time.perf_counter()
+        context = self._retrieve_context(question, tenant_id)
+        return context, (time.perf_counter() - start) * 1000
+
+    def answer_question(self, question: str, context: Optional[str] = None, tenant_id: Optional[str] = None) -> str:
+        if context is None:
+            context = self._retrieve_context(question, tenant_id)
+        # Paraphrases of an already answered question with the same context reuse that answer.
+        with self.engine_for(tenant_id) as engine:
+            question_emb = engine.embed_query(question)
+            version = engine.version
+        answer = self._lookup_answer(question_emb, context, version)
+        if answer is None:
+            with tracer.span("llm.rag_chain", prompt_tokens=self._record_rag_prompt(context, question)) as span:
+                answer = self.rag_chain.invoke({"context": context, "question": question})
+                span.set(completion_tokens=self.context_builder.count_tokens(answer))
+            self.answer_cache.store(question_emb, context, answer, version)
+        return answer
+
+    async def aanswer_question(self, question: str, context: Optional[str] = None,
+                               tenant_id: Optional[str] = None) -> str:
+        # Embedding, vector search and loading a cold tenant are CPU/disk bound, so they run
+        # off the event loop.
+        if context is None:
+            context = await asyncio.to_thread(self._retrieve_context, question, tenant_id)
+        async with self.aengine_for(tenant_id) as engine:
+            question_emb = await asyncio.to_thread(engine.embed_query, question)
+            version = engine.version
+        answer = self._lookup_answer(question_emb, context, version)
+        if answer is None:
+            with tracer.span("llm.rag_chain", prompt_tokens=self._record_rag_prompt(context, question)) as span:
+                answer = await self.rag_chain.ainvoke({"context": context, "question": question})
+                span.set(completion_tokens=self.context_builder.count_tokens(answer))
+            self.answer_cache.store(question_emb, context, answer, version)
+        return answer
+
+    def _lookup_answer(self, question_emb, context: str, version) -> Optional[str]:
+        with tracer.span("answer_cache.lookup") as span:
+            answer = self.answer_cache.lookup(question_emb, context, version)
+            span.set(cache_hit=answer is not None)
+        return answer
+
+    def _prefetch_context(self, question: str, tenant_id: Optional[str] = None):
+        # Retrieval is started before we know whether the turn needs it; unused results are
+        # simply dropped (they still warm the query and result caches).
+        # The copied context keeps the retrieval spans under the node that started them.
+        return self._executor.submit(contextvars.copy_context().run, self._timed_retrieve_context, question,
+                                     tenant_id)
+
+    def warm_answer_cache(self, questions, tenant_id: Optional[str] = None):
+        for question in questions:
+            try:
+                self.answer_question(question, tenant_id=tenant_id)
+            except Exception as e:
+                logger.warning(f"Could not pre-warm answer for {question!r}: {e}")
+
+    # The engine caches the list until its knowledge base changes or it is closed.
+    def supported_platforms(self, tenant_id: Optional[str] = None):
+        with self.engine_for(tenant_id) as engine:
+            return engine.get_supported_platforms()
+
+    async def asupported_platforms(self, tenant_id: Optional[str] = None):
+        async with self.aengine_for(tenant_id) as engine:
+            return await asyncio.to_thread(engine.get_supported_platforms)
+
+    def cache_stats(self):
+        stats = {"answers": self.answer_cache.stats(), "prompts": self.prompt_stats.stats(), "llm": self.llm_client.stats()}
+        if self.tenants is not None:
+            return {**stats, "tenants": self.tenants.stats()}
+        return {**stats, **self.rag_engine.cache_stats()}
+
+    def _local_intent(self, user_input: str) -> Optional[Intent]:
+        if self.intent_classifier is None:
+            return None
+        with tracer.span("intent.local") as span:
+            label, _ = self.intent_classifier.classify(user_input)
+            span.set(label=label)
+        return None if label is None else INTENT_LABELS.get(label, Intent.UNKNOWN)
 
     def identify_intent(self, user_input: str) -> Intent:
+        intent = self._local_intent(user_input)
+        return intent if intent is not None else self.identify_intent_llm(user_input)
+
+    async def aidentify_intent(self, user_input: str) -> Intent:
+        intent = await asyncio.to_thread(self._local_intent, user_input)
+        return intent if intent is not None else await self.aidentify_intent_llm(user_input)
+
+    def identify_intent_llm(self, user_input: str) -> Intent:
         try:
-            prediction = self.intent_chain.invoke({"user_input": user_input}).strip().lower()
-            if "high_intent" in prediction: return Intent.HIGH_INTENT
-            if "inquiry" in prediction: return Intent.INQUIRY
-            if "greeting" in prediction: return Intent.GREETING
+            with tracer.span("llm.intent_chain"):
+                return _parse_intent(self.intent_chain.invoke({"user_input": user_input}))
+        except Exception as e:
+            logger.error(f"Intent classification failed: {e}")
             return Intent.UNKNOWN
+
+    async def aidentify_intent_llm(self, user_input: str) -> Intent:
+        try:
+            with tracer.span("llm.intent_chain"):
+                return _parse_intent(await self.intent_chain.ainvoke({"user_input": user_input}))
         except Exception as e:
             logger.error(f"Intent classification failed: {e}")
             return Intent.UNKNOWN
 
-    def _build_graph(self):
+    def invoke_streaming(self, graph_input, on_token, thread_id: str, on_node=None) -> AgentState:
+        # Runs the graph once for the session, passing answer text to on_token as soon as it is
+        # generated. Responses that are not generated token by token (static replies, cached
+        # answers) are passed on in one piece, so callers see the same interface for every node.
+        # graph_input is this turn's input (or a Command resuming a lead question); the full
+        # state is returned, with "__interrupt__" set when the graph waits for the user.
+        relay = _TokenRelay(on_token, on_node)
+        final_state = {}
+        for mode, payload in self.graph.stream(graph_input, self.session_config(thread_id),
+                                               stream_mode=["messages", "updates", "values"], durability="exit"):
+            final_state = relay.feed(mode, payload) or final_state
+        return relay.finish(final_state)
+
+    async def ainvoke_streaming(self, graph_input, on_token, thread_id: str, on_node=None) -> AgentState:
+        relay = _TokenRelay(on_token, on_node)
+        final_state = {}
+        async for mode, payload in self.graph.astream(graph_input, self.session_config(thread_id),
+                                                      stream_mode=["messages", "updates", "values"], durability="exit"):
+            final_state = relay.feed(mode, payload) or final_state
+        return relay.finish(final_state)
+
+    def _build_graph(self, checkpointer=None):
+        from langgraph.graph import StateGraph
         sg = StateGraph(AgentState)
         
-        # Add Nodes
-        sg.add_node('greetings', self.greeting_node)
-        sg.add_node('intent', self.intent_node)
-        sg.add_node('rag', self.rag_node)
-        sg.add_node('lead_qual', self.lead_qual_node)
-        sg.add_node('lead_capture', self.lead_capture_node)
-        sg.add_node('fallback', self.fallback_node)
+        # Add Nodes; nodes that wait on the LLM also have a coroutine used by graph.ainvoke/astream.
+        sg.add_node('greetings', _traced_node('greetings', self.greeting_node, self.agreeting_node))
+        sg.add_node('intent', _traced_node('intent', self.intent_node, self.aintent_node))
+        sg.add_node('rag', _traced_node('rag', self.rag_node, self.arag_node))
+        # Lead qualification: each collect_<field> node pauses on one interrupt() until the
+        # user's reply arrives, then routes itself with a Command.
+        lead_nodes = [f"collect_{field}" for field in LEAD_QUESTIONS] + ['lead_capture']
+        sg.add_node('lead_qual', _traced_node('lead_qual', self.lead_qual_node), destinations=tuple(lead_nodes))
+        for field in LEAD_QUESTIONS:
+            sg.add_node(f"collect_{field}",
+                        _traced_node(f"collect_{field}", partial(self.collect_lead_node, field), partial(self.acollect_lead_node, field)),
+                        destinations=tuple(lead_nodes))
+        sg.add_node('lead_capture', _traced_node('lead_capture', self.lead_capture_node))
+        sg.add_node('fallback', _traced_node('fallback', self.fallback_node))
         
         # Conditional Edges
         sg.add_conditional_edges(START, self.start_router)
         sg.add_edge('greetings', END)
         sg.add_conditional_edges('intent', self.edge_fn)
         sg.add_edge('rag', END)
-        sg.add_conditional_edges('lead_qual', self.lead_qual_transition)
         sg.add_edge('lead_capture', END)
         sg.add_edge('fallback', END)
         
-        return sg.compile()
+        return sg.compile(checkpointer=checkpointer)
+
+    # Nodes return only the keys they change, so a checkpointer writes a small delta per step.
+    def _reply(self, response: str, **updates):
+        return {'agent_response': response, 'messages': [{'role': 'assistant', 'content': response}], **updates}
 
-    # Nodes
     def greeting_node(self, state: AgentState):
         user_input = state.get('user_input', '')
-        if user_input:
-            context = "\n---\n".join(self.rag_engine.retrieve(user_input))
-            state['agent_response'] = self.rag_chain.invoke({"context": context, "question": user_input})
-        else:
-            state['agent_response'] = "Hi! I'm your AutoStream assistant. How can I help you today?"
-        state['step'] = 'await_user'
-        return state
+        if not user_input:
+            return self._reply(GREETING_MESSAGE, step='await_user')
+        answer = self.answer_question(user_input, state.get('prefetched_context'), state.get('tenant_id'))
+        return self._reply(answer, step='await_user', prefetched_context=None)
+
+    async def agreeting_node(self, state: AgentState):
+        user_input = state.get('user_input', '')
+        if not user_input:
+            return self._reply(GREETING_MESSAGE, step='await_user')
+        answer = await self.aanswer_question(user_input, state.get('prefetched_context'), state.get('tenant_id'))
+        return self._reply(answer, step='await_user', prefetched_context=None)
 
     def intent_node(self, state: AgentState):
-        state['intent'] = self.identify_intent(state.get('user_input', ''))
-        state['agent_response'] = None
-        return state
+        user_input = state.get('user_input', '')
+        start = time.perf_counter()
+        prefetch = self._prefetch_context(user_input, state.get('tenant_id')) if user_input else None
+        intent = self.identify_intent(user_input)
+        intent_ms = (time.perf_counter() - start) * 1000
+        update = {'intent': intent, 'agent_response': None, 'prefetched_context': None}
+        if prefetch is not None and intent in CONTEXT_INTENTS:
+            update['prefetched_context'], retrieval_ms = prefetch.result()
+            update['turn_timings'] = self._record_overlap(start, intent_ms, retrieval_ms)
+        return update
+
+    async def aintent_node(self, state: AgentState):
+        user_input = state.get('user_input', '')
+        start = time.perf_counter()
+        prefetch = asyncio.wrap_future(self._prefetch_context(user_input, state.get('tenant_id'))) if user_input else None
+        intent = await self.aidentify_intent(user_input)
+        intent_ms = (time.perf_counter() - start) * 1000
+        update = {'intent': intent, 'agent_response': None, 'prefetched_context': None}
+        if prefetch is not None and intent in CONTEXT_INTENTS:
+            update['prefetched_context'], retrieval_ms = await prefetch
+            update['turn_timings'] = self._record_overlap(start, intent_ms, retrieval_ms)
+        return update
+
+    def _record_overlap(self, start: float, intent_ms: float, retrieval_ms: float):
+        wall_ms = (time.perf_counter() - start) * 1000
+        timings = {
+            "intent_ms": round(intent_ms, 1),
+            "retrieval_ms": round(retrieval_ms, 1),
+            "wall_ms": round(wall_ms, 1),
+            # What running the two steps back to back would have cost on top of this turn.
+            "overlap_saved_ms": round(max(intent_ms + retrieval_ms - wall_ms, 0.0), 1),
+        }
+        logger.info(f"Intent + retrieval overlap: {timings}")
+        return timings
 
     def rag_node(self, state: AgentState):
-        user_input = state.get('user_input', '')
-        context = "\n---\n".join(self.rag_engine.retrieve(user_input))
-        state['agent_response'] = self.rag_chain.invoke({"context": context, "question": user_input})
-        state['step'] = 'await_user'
-        return state
+        answer = self.answer_question(state.get('user_input', ''), state.get('prefetched_context'), state.get('tenant_id'))
+        return self._reply(answer, step='await_user', prefetched_context=None)
 
-    def lead_qual_node(self, state: AgentState):
-        if not isinstance(state.get('lead_state'), dict):
-            state['lead_state'] = {"name": None, "email": None, "platform": None}
-        
-        ls = state['lead_state']
-        user_input = state.get('user_input', '')
-        is_streamlit = state.get('is_streamlit', False)
-        state['agent_response'] = None
+    async def arag_node(self, state: AgentState):
+        answer = await self.aanswer_question(state.get('user_input', ''), state.get('prefetched_context'),
+                                             state.get('tenant_id'))
+        return self._reply(answer, step='await_user', prefetched_context=None)
 
-        # Determine which question we are expecting an answer for
-        is_answering = state.get('asked_name') or state.get('asked_email') or state.get('asked_platform')
-        
-        # If the user is replying to a specific question, validate it
-        if user_input and is_answering:
-            # Get the actual question text we asked last turn
-            question_text = ""
-            if state.get('asked_name'): question_text = "May I have your name?"
-            elif state.get('asked_email'): question_text = "What is your email address?"
-            elif state.get('asked_platform'): question_text = "Which platform do you use?"
-
-            validation = self.validation_chain.invoke({"question": question_text, "user_input": user_input}).strip().lower()
-            
-            if "questioning" in validation:
-                # User asked a clarifying question instead of answering
-                logger.info("Clarifying question detected during lead qual.")
-                context = "\n---\n".join(self.rag_engine.retrieve(user_input))
-                rag_answer = self.rag_chain.invoke({"context": context, "question": user_input})
-                state['agent_response'] = f"{rag_answer}\n\nAnyway, {question_text}"
-                state['step'] = 'await_user'
-                return state
-
-        # Proceed with normal info capture
-        if not ls.get("name"):
-            if is_streamlit:
-                if not state.get('asked_name'):
-                    # First time asking
-                    state.update({'agent_response': "Great! To get started, may I have your name?", 'asked_name': True, 'step': 'await_user'})
-                    return state
-                # We were waiting for the name, and we got it
-                ls["name"] = user_input
-                state['asked_name'] = False
-            else:
-                ls["name"] = input("Name: ")
-
-        if ls.get("name") and not ls.get("email"):
-            if is_streamlit:
-                if not state.get('asked_email'):
-                    state.update({'agent_response': "Thanks! Now, what is your email address?", 'asked_email': True, 'step': 'await_user'})
-                    return state
-                ls["email"] = user_input
-                state['asked_email'] = False
-            else:
-                ls["email"] = input("Email: ")
-
-        if ls.get("name") and ls.get("email") and not ls.get("platform"):
-            if is_streamlit:
-                if not state.get('asked_platform'):
-                    state.update({'agent_response': "Almost there! Which creator platform do you use (YouTube, Instagram, etc.)?", 'asked_platform': True, 'step': 'await_user'})
-                    return state
-                ls["platform"] = user_input
-                state['asked_platform'] = False
-            else:
-                ls["platform"] = input("Platform: ")
-
-        state['lead_state'] = ls
-        state['step'] = 'lead_capture' if all(ls.values()) else 'await_user'
-        return state
+    def lead_qual_node(self, state: AgentState):
+        return self._ask_next_lead_field(dict(state.get('lead_state') or {"name": None, "email": None, "platform": None}))
+
+    def _ask_next_lead_field(self, ls: dict, **updates):
+        from langgraph.types import Command
+        missing = [field for field in LEAD_QUESTIONS if not ls.get(field)]
+        if not missing:
+            return Command(goto='lead_capture', update={'lead_state': ls, **updates})
+        field = missing[0]
+        reply = self._reply(LEAD_QUESTIONS[field][0], step='await_user')
+        reply['messages'] = updates.pop('messages', []) + reply['messages']
+        return Command(goto=f"collect_{field}", update={'lead_state': ls, **updates, **reply})
+
+    # The graph stops at interrupt() and the turn ends with the question as the response; the
+    # next user message resumes the node here with that message as the reply.
+    def collect_lead_node(self, field: str, state: AgentState):
+        from langgraph.types import interrupt
+        question_text = LEAD_QUESTIONS[field][1]
+        user_input = interrupt(question_text)
+
+        # Obvious answers and obvious questions are decided locally; only ambiguous replies hit the LLM.
+        tenant_id = state.get('tenant_id')
+        platforms = self.supported_platforms(tenant_id) if field == "platform" else ()
+        validation, value = classify_reply(field, user_input, platforms)
+        prefetch = None
+        if validation is None:
+            # Fetch context for a possible clarifying question while the LLM decides.
+            prefetch = self._prefetch_context(user_input, tenant_id)
+            with tracer.span("llm.validation_chain", field=field):
+                validation = self.validation_chain.invoke({"question": question_text, "user_input": user_input}).strip().lower()
+
+        if "questioning" in validation:
+            context = prefetch.result()[0] if prefetch is not None else None
+            return self._reask_lead_question(field, user_input, self.answer_question(user_input, context, tenant_id))
+        return self._store_lead_field(state, field, user_input, value)
+
+    async def acollect_lead_node(self, field: str, state: AgentState):
+        from langgraph.types import interrupt
+        question_text = LEAD_QUESTIONS[field][1]
+        user_input = interrupt(question_text)
+
+        tenant_id = state.get('tenant_id')
+        platforms = await self.asupported_platforms(tenant_id) if field == "platform" else ()
+        validation, value = classify_reply(field, user_input, platforms)
+        prefetch = None
+        if validation is None:
+            prefetch = asyncio.wrap_future(self._prefetch_context(user_input, tenant_id))
+            with tracer.span("llm.validation_chain", field=field):
+                validation = (await self.validation_chain.ainvoke({"question": question_text, "user_input": user_input})).strip().lower()
+
+        if "questioning" in validation:
+            context = (await prefetch)[0] if prefetch is not None else None
+            return self._reask_lead_question(field, user_input, await self.aanswer_question(user_input, context, tenant_id))
+        return self._store_lead_field(state, field, user_input, value)
+
+    def _reask_lead_question(self, field: str, user_input: str, rag_answer: str):
+        # User asked a clarifying question instead of answering; loop back and wait again.
+        from langgraph.types import Command
+        logger.info("Clarifying question detected during lead qual.")
+        update = self._reply(f"{rag_answer}\n\nAnyway, {LEAD_QUESTIONS[field][1]}", step='await_user', user_input=user_input)
+        update['messages'] = [{'role': 'user', 'content': user_input}] + update['messages']
+        return Command(goto=f"collect_{field}", update=update)
+
+    def _store_lead_field(self, state: AgentState, field: str, user_input: str, value: Optional[str]):
+        ls = dict(state.get('lead_state') or {})
+        ls[field] = value or user_input
+        return self._ask_next_lead_field(ls, user_input=user_input, messages=[{'role': 'user', 'content': user_input}])
 
     def lead_capture_node(self, state: AgentState):
         ls = state['lead_state']
-        state['agent_response'] = f"✅ Thank you {ls['name']}! We'll reach out to {ls['email']} soon."
-        state['step'] = END
-        return state
+        if self.lead_store is not None:
+            # submit() only enqueues; the writer thread resolves the future once the lead is durable.
+            try:
+                self.lead_store.submit(ls).add_done_callback(_log_lead_failure)
+            except Exception as e:
+                logger.error(f"Could not queue lead for {ls.get('email')!r}: {e}")
+        return self._reply(f"✅ Thank you {ls['name']}! We'll reach out to {ls['email']} soon.",
+                           step=END, lead_captured=True)
 
     def fallback_node(self, state: AgentState):
-        state.update({'agent_response': "I'm here to help with product info or sign-up!", 'step': 'await_user'})
-        return state
+        return self._reply("I'm here to help with product info or sign-up!", step='await_user')
 
     # Routers
     def start_router(self, state: AgentState):
-        if state.get('asked_name') or state.get('asked_email') or state.get('asked_platform'):
-            return 'lead_qual'
-        ls = state.get('lead_state')
-        if isinstance(ls, dict) and ls.get("name") and not all(ls.values()):
-            return 'lead_qual'
-        return 'intent' if state.get('step') == 'intent' else 'greetings'
+        # Replies to lead questions resume the waiting collect_<field> node and never reach
+        # START, so a new run is either the opening greeting or a fresh user message.
+        return 'intent' if state.get('user_input') else 'greetings'
 
     def edge_fn(self, state: AgentState):
         intent = state.get('intent', Intent.UNKNOWN)
@@ -244,5 +668,3 @@ Answer:
         if intent == Intent.HIGH_INTENT: return 'lead_qual'
         return 'fallback'
 
-    def lead_qual_transition(self, state: AgentState):
-        return 'lead_capture' if state.get('step') == 'lead_capture' else END
@@ -0,0 +1,54 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keeps only a thread's latest checkpoint (per namespace) and the writes pending on it,
+# e.g. the interrupt a lead question is paused on. Checkpoint ids sort by creation time.
+_PRUNE_SQL = (
+    "DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < ("
+    "SELECT MAX(latest.checkpoint_id) FROM checkpoints AS latest "
+    "WHERE latest.thread_id = {table}.thread_id AND latest.checkpoint_ns = {table}.checkpoint_ns)"
+)
+_PRUNE_STATEMENTS = [_PRUNE_SQL.format(table=table) for table in ("writes", "checkpoints")]
+
+
+def _prune_memory(saver, thread_id):
+    namespaces = saver.storage.get(thread_id)
+    for ns, checkpoints in (namespaces or {}).items():
+        if len(checkpoints) < 2:
+            continue
+        latest_id = max(checkpoints)
+        kept = saver.serde.loads_typed(checkpoints[latest_id][0])["channel_versions"]
+        for checkpoint_id in [c for c in checkpoints if c != latest_id]:
+            old = saver.serde.loads_typed(checkpoints.pop(checkpoint_id)[0])["channel_versions"]
+            saver.writes.pop((thread_id, ns, checkpoint_id), None)
+            # Channel values the kept checkpoint no longer points to.
+            for channel, version in old.items():
+                if kept.get(channel) != version:
+                    saver.blobs.pop((thread_id, ns, channel, version), None)
+
+
+# Drops every checkpoint of the thread but the latest, so a session's storage stays the size
+# of one state however many turns it has. Only the latest checkpoint is ever resumed.
+def prune_thread(checkpointer, thread_id):
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    if isinstance(checkpointer, SqliteSaver):
+        with checkpointer.cursor() as cur:
+            for statement in _PRUNE_STATEMENTS:
+                cur.execute(statement, (str(thread_id),))
+    elif isinstance(checkpointer, InMemorySaver):
+        _prune_memory(checkpointer, thread_id)
+    else:
+        logger.debug(f"Checkpoints of {type(checkpointer).__name__} are not pruned.")
+
+
+async def aprune_thread(checkpointer, thread_id):
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    if isinstance(checkpointer, AsyncSqliteSaver):
+        async with checkpointer.lock, checkpointer.conn.cursor() as cur:
+            for statement in _PRUNE_STATEMENTS:
+                await cur.execute(statement, (str(thread_id),))
+            await checkpointer.conn.commit()
+    else:
+        prune_thread(checkpointer, thread_id)
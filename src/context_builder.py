@@ -0,0 +1,143 @@
+import threading
+import numpy as np
+
+SEPARATOR = "\n---\n"
+
+
+# Gemini's tokenizer is only reachable through the API, so budgets use the usual
+# ~4 characters per token estimate. Pass count_tokens to use a real tokenizer.
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _same_section(markdown_section, json_section):
+    # Compared on the full path: "## Pro Plan" under "# Pricing & Features" is the json
+    # "pricing_features/pro_plan". A json leaf such as "policies/refund_policy" does not cover
+    # the markdown "policies" section, which also holds the support terms.
+    return bool(markdown_section) and markdown_section == json_section
+
+
+class ContextBuilder:
+    # Turns retrieval hits into the context block of the RAG prompt: near-duplicates are
+    # dropped, structured (json) chunks win over markdown chunks of the same section, and
+    # the result is cut to token_budget tokens.
+    def __init__(self, token_budget=250, dedup_threshold=0.9, count_tokens=estimate_tokens):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.count_tokens = count_tokens
+
+    def _order(self, hits):
+        # Keep the retrieval order, but move each json chunk ahead of the first markdown
+        # chunk it covers, so the greedy pass below keeps the structured version.
+        ordered = list(hits)
+        for hit in hits:
+            meta = hit.get("metadata") or {}
+            if meta.get("source") != "json":
+                continue
+            for i, other in enumerate(ordered):
+                other_meta = other.get("metadata") or {}
+                if other is hit:
+                    break
+                if other_meta.get("source") == "markdown" and _same_section(other_meta.get("section"), meta.get("section", "")):
+                    ordered.remove(hit)
+                    ordered.insert(i, hit)
+                    break
+        return ordered
+
+    def _is_redundant(self, hit, kept):
+        meta = hit.get("metadata") or {}
+        for other in kept:
+            other_meta = other.get("metadata") or {}
+            if meta.get("source") == "markdown" and other_meta.get("source") == "json" \
+                    and _same_section(meta.get("section"), other_meta.get("section", "")):
+                return True
+            if hit.get("embedding") is not None and other.get("embedding") is not None \
+                    and float(np.dot(hit["embedding"], other["embedding"])) >= self.dedup_threshold:
+                return True
+        return False
+
+    def _trim(self, text, budget):
+        # Keep whole lines while they fit; a chunk's heading and first facts come first.
+        lines, used = [], 0
+        for line in text.split("\n"):
+            cost = self.count_tokens(line + "\n")
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(lines).strip()
+
+    def build(self, hits):
+        kept, parts, used = [], [], 0
+        dropped = trimmed = 0
+        separator_cost = self.count_tokens(SEPARATOR)
+        for hit in self._order(hits):
+            if self._is_redundant(hit, kept):
+                dropped += 1
+                continue
+            remaining = self.token_budget - used - (separator_cost if parts else 0)
+            text = hit["document"]
+            if self.count_tokens(text) > remaining:
+                text = self._trim(text, remaining)
+                trimmed += 1
+                if not text:
+                    break
+            kept.append(hit)
+            parts.append(text)
+            used += self.count_tokens(text) + (separator_cost if len(parts) > 1 else 0)
+        context = SEPARATOR.join(parts)
+        stats = {
+            "hits": len(hits),
+            "kept": len(parts),
+            "duplicates_dropped": dropped,
+            "trimmed": trimmed,
+            "context_tokens": self.count_tokens(context),
+            "raw_tokens": self.count_tokens(SEPARATOR.join(hit["document"] for hit in hits)),
+        }
+        return context, stats
+
+
+class PromptStats:
+    # Running totals of what the RAG prompts cost, for cache_stats() and benchmarks.
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.contexts = 0
+        self.context_tokens = 0
+        self.raw_context_tokens = 0
+        self.duplicates_dropped = 0
+        self.retrieval_ms = 0.0
+        self.filtered = 0
+        self.filter_fallbacks = 0
+        self.last_prompt_tokens = None
+        self._lock = threading.Lock()
+
+    def record_context(self, context_stats):
+        with self._lock:
+            self.contexts += 1
+            self.context_tokens += context_stats["context_tokens"]
+            self.raw_context_tokens += context_stats["raw_tokens"]
+            self.duplicates_dropped += context_stats["duplicates_dropped"]
+            self.retrieval_ms += context_stats.get("retrieval_ms", 0.0)
+            self.filtered += context_stats.get("filtered", False)
+            self.filter_fallbacks += context_stats.get("filter_fallback", False)
+
+    def record_prompt(self, prompt_tokens):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.last_prompt_tokens = prompt_tokens
+
+    def stats(self):
+        return {
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "avg_prompt_tokens": self.prompt_tokens / self.calls if self.calls else 0.0,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "contexts_built": self.contexts,
+            "duplicates_dropped": self.duplicates_dropped,
+            "context_tokens_saved": self.raw_context_tokens - self.context_tokens,
+            "avg_retrieval_ms": self.retrieval_ms / self.contexts if self.contexts else 0.0,
+            "filtered_retrievals": self.filtered,
+            "filter_fallbacks": self.filter_fallbacks,
+        }
@@ -0,0 +1,125 @@
+import re
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Labelled utterances per intent label; labels match the categories of the LLM intent prompt.
+INTENT_EXAMPLES = {
+    "greeting": [
+        "hi",
+        "hello",
+        "hey there",
+        "good morning",
+        "hi, who are you?",
+        "who are you",
+        "what is this",
+        "what is this bot",
+        "what can you do",
+        "hello, what do you do?",
+        "yo",
+        "greetings",
+    ],
+    "inquiry": [
+        "what are your plans",
+        "pricing?",
+        "how much is pro",
+        "how much does the basic plan cost",
+        "tell me about your pricing plans",
+        "what services do you provide",
+        "what features do you have",
+        "do you support tiktok",
+        "which platforms do you support",
+        "does the pro plan include ai captions",
+        "how does the ai captioning work",
+        "can I export in 4k",
+        "what is your refund policy",
+        "do you offer 24/7 support",
+        "what resolution does the basic plan have",
+        "how many videos can I edit per month",
+        "what is the difference between basic and pro",
+        "how does automated video editing work",
+    ],
+    "high_intent": [
+        "I want to buy the pro plan",
+        "I want to purchase the Pro plan",
+        "sign me up",
+        "I'd like to sign up",
+        "I want to subscribe to the basic plan",
+        "let's get started",
+        "I'm ready to buy",
+        "I want to try it for my youtube channel",
+        "how do I sign up? I want the pro plan",
+        "count me in, I'll take the pro plan",
+        "I would like to get the basic plan",
+        "I want to start using AutoStream",
+    ],
+    "info_update": [
+        "Shivangi",
+        "John Smith",
+        "my name is Alex",
+        "abc@gmail.com",
+        "my email is jane.doe@example.com",
+        "YouTube",
+        "Instagram",
+        "I use TikTok",
+        "Twitch",
+        "it's LinkedIn",
+    ],
+}
+
+_GREETING_RE = re.compile(
+    r"^\s*(hi|hii+|hello|hey|hey there|hiya|yo|greetings|good (morning|afternoon|evening))"
+    r"( there)?[\s!.,]*$",
+    re.IGNORECASE,
+)
+# "start" alone is not a purchase: "I want to start by asking about pricing".
+_HIGH_INTENT_RE = re.compile(
+    r"\b(sign me up|count me in|(i want|i'd like|i would like|i'm ready|i am ready|ready) to "
+    r"(buy|purchase|sign up|subscribe|get started|start using|upgrade))\b",
+    re.IGNORECASE,
+)
+_EMAIL_RE = re.compile(r"^\s*[\w.+-]+@[\w-]+(\.[\w-]+)+\s*$")
+
+
+class LocalIntentClassifier:
+    def __init__(self, rag_engine, examples=None, threshold=0.5, margin=0.05):
+        self.rag_engine = rag_engine
+        self.examples = examples or INTENT_EXAMPLES
+        # A prediction is trusted only when the best centroid clears the threshold by the margin.
+        self.threshold = threshold
+        self.margin = margin
+        self._labels = None
+        self._centroids = None
+
+    def _fit(self):
+        model = self.rag_engine.get_model()
+        labels, centroids = [], []
+        for label, utterances in self.examples.items():
+            embeddings = model.encode(utterances, normalize_embeddings=True)
+            centroid = np.mean(embeddings, axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+            labels.append(label)
+        self._labels = labels
+        self._centroids = np.stack(centroids)
+
+    # Returns (label, confidence); label is None when the LLM should decide.
+    def classify(self, text):
+        if not text or not text.strip():
+            return None, 0.0
+        if _EMAIL_RE.match(text):
+            return "info_update", 1.0
+        if _GREETING_RE.match(text):
+            return "greeting", 1.0
+        if _HIGH_INTENT_RE.search(text):
+            return "high_intent", 1.0
+
+        if self._centroids is None:
+            self._fit()
+        scores = self._centroids @ self.rag_engine.embed_query(text)
+        order = np.argsort(-scores)
+        best, runner_up = float(scores[order[0]]), float(scores[order[1]])
+        if best >= self.threshold and best - runner_up >= self.margin:
+            return self._labels[order[0]], best
+        logger.debug(f"Local intent not confident for {text!r} ({best:.2f} vs {runner_up:.2f}).")
+        return None, best
@@ -0,0 +1,284 @@
+import os
+import csv
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("batch", "interval", "off")
+LEAD_FIELDS = ("email", "name", "platform", "captured_at")
+
+_CLOSE = object()
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+class LeadStore:
+    # Durable sink for captured leads. submit() only enqueues; a background writer appends
+    # each batch of leads to a write-ahead log (leads.wal, one JSON line per lead), fsyncs it
+    # according to the policy and then resolves the leads' futures. The log is periodically
+    # compacted into a SQLite table keyed by email, so repeated submissions of one email
+    # leave one row holding the latest name/platform and the first capture time.
+    #
+    # fsync policies:
+    #   "batch":    fsync once per batch before acknowledging it; an acknowledged lead
+    #               survives a crash of the process or the machine.
+    #   "interval": acknowledge after the write reaches the OS and fsync at most every
+    #               fsync_interval_ms; survives a process crash, a power loss may lose the
+    #               last interval.
+    #   "off":      never fsync explicitly; survives a process crash only.
+    def __init__(self, directory="leads", fsync="batch", fsync_interval_ms=50, max_batch=512,
+                 compact_bytes=4 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.max_batch = max_batch
+        self.compact_bytes = compact_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.wal_path = os.path.join(directory, "leads.wal")
+        self.db_path = os.path.join(directory, "leads.db")
+
+        self.submitted = 0
+        self.written = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.compactions = 0
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS leads (email TEXT PRIMARY KEY, name TEXT, platform TEXT, "
+                         "captured_at REAL, updated_at REAL)")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        # Leads that were written since the last compaction, {email: (name, platform)}, so an
+        # identical resubmission is acknowledged without another log entry.
+        self._logged = {}
+        recovered = self._recover()
+        if recovered:
+            logger.info(f"Recovered {recovered} leads from {self.wal_path}.")
+        self._wal = open(self.wal_path, "ab")
+        self._last_fsync = time.monotonic()
+        self._queue = queue.SimpleQueue()
+        # Taken to enqueue and to close, so nothing is queued behind the _CLOSE sentinel, where the
+        # writer would never see it and its future would never resolve.
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="lead-writer", daemon=True)
+        self._writer.start()
+
+    # Returns a Future that resolves to True once the lead is durable under the fsync policy
+    # (False for a duplicate of a lead already logged). Never blocks on I/O.
+    def submit(self, lead):
+        record = {
+            "email": normalize_email(lead.get("email")),
+            "name": lead.get("name"),
+            "platform": lead.get("platform"),
+            "captured_at": lead.get("captured_at") or time.time(),
+        }
+        if not record["email"]:
+            raise ValueError("A lead needs an email address")
+        future = Future()
+        self._enqueue((record, future))
+        self.submitted += 1
+        return future
+
+    # Folds the log into SQLite now, e.g. before reading the table.
+    def compact(self):
+        future = Future()
+        self._enqueue(("compact", future))
+        return future.result()
+
+    def _enqueue(self, entry):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("LeadStore is closed")
+            self._queue.put(entry)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_CLOSE)
+        self._writer.join()
+        with self._db_lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _recover(self):
+        # A crash can leave a torn last line; everything before it was written whole.
+        if not os.path.exists(self.wal_path) or not os.path.getsize(self.wal_path):
+            return 0
+        records = list(self._read_wal())
+        self._fold(records)
+        with open(self.wal_path, "r+b") as f:
+            f.truncate(0)
+            os.fsync(f.fileno())
+        return len(records)
+
+    def _read_wal(self):
+        with open(self.wal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logger.warning(f"Ignoring a torn record at the end of {self.wal_path}.")
+                    break
+                yield json.loads(line)
+
+    def _run(self):
+        while True:
+            timeout = self.fsync_interval if self.fsync == "interval" else None
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._sync_wal(force=False)
+                continue
+            batch, control = [], None
+            while True:
+                if entry is _CLOSE or (isinstance(entry, tuple) and entry[0] == "compact"):
+                    control = entry
+                    break
+                batch.append(entry)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            if control is _CLOSE:
+                self._sync_wal(force=True)
+                self._compact()
+                return
+            if control is not None:
+                self._run_compaction(control[1])
+            elif self._wal.tell() >= self.compact_bytes:
+                self._run_compaction(None)
+
+    def _write_batch(self, batch):
+        lines, acks = [], []
+        for record, future in batch:
+            fields = (record["name"], record["platform"])
+            if self._logged.get(record["email"]) == fields:
+                self.duplicates += 1
+                acks.append((future, False))
+                continue
+            self._logged[record["email"]] = fields
+            lines.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            acks.append((future, True))
+        try:
+            if lines:
+                self._wal.write(b"".join(lines))
+                self._wal.flush()
+                self._sync_wal(force=self.fsync == "batch")
+        except Exception as e:
+            logger.error(f"Could not write {len(lines)} leads to {self.wal_path}: {e}")
+            for future, _ in acks:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.written += len(lines)
+        for future, written in acks:
+            future.set_result(written)
+
+    def _sync_wal(self, force):
+        if self.fsync == "off":
+            return
+        if force or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._wal.fileno())
+            self.fsyncs += 1
+            self._last_fsync = time.monotonic()
+
+    def _run_compaction(self, future):
+        try:
+            self._compact()
+        except Exception as e:
+            logger.error(f"Lead log compaction failed: {e}")
+            if future is not None:
+                future.set_exception(e)
+            return
+        if future is not None:
+            future.set_result(True)
+
+    def _compact(self):
+        # The table commit is durable (synchronous=FULL) before the log is truncated; a crash
+        # in between replays the log again, which the upsert makes harmless.
+        if not self._wal.tell():
+            return
+        self._wal.flush()
+        if self.fsync != "off":
+            os.fsync(self._wal.fileno())
+        self._fold(self._read_wal())
+        self._wal.truncate(0)
+        self._wal.seek(0)
+        if self.fsync != "off":
+            os.fsync(self._wal.fileno())
+        self._logged.clear()
+        self.compactions += 1
+
+    def _fold(self, records):
+        now = time.time()
+        with self._db_lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO leads (email, name, platform, captured_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(email) DO UPDATE SET name = excluded.name, platform = excluded.platform, "
+                    "captured_at = MIN(leads.captured_at, excluded.captured_at), updated_at = excluded.updated_at",
+                    ((r["email"], r["name"], r["platform"], r["captured_at"], now) for r in records),
+                )
+
+    def count(self):
+        self.compact()
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    # Writes every lead, oldest capture first, as CSV or JSONL; returns the number of rows.
+    def export(self, path, fmt="csv"):
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.compact()
+        rows = 0
+        with self._db_lock, open(path, "w", newline="", encoding="utf-8") as f:
+            cursor = self._db.execute(f"SELECT {', '.join(LEAD_FIELDS)} FROM leads ORDER BY captured_at")
+            writer = csv.writer(f) if fmt == "csv" else None
+            if writer is not None:
+                writer.writerow(LEAD_FIELDS)
+            while True:
+                chunk = cursor.fetchmany(1000)
+                if not chunk:
+                    break
+                for row in chunk:
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        f.write(json.dumps(dict(zip(LEAD_FIELDS, row))) + "\n")
+                rows += len(chunk)
+        return rows
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "batches": self.batches,
+            "avg_batch_size": self.written / self.batches if self.batches else 0.0,
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+            "wal_bytes": os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0,
+        }
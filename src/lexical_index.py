@@ -0,0 +1,86 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+# Prices ("$79"), resolutions ("4k", "720p") and plain words each stay one token.
+_TOKEN_RE = re.compile(r"\$?\d+(?:\.\d+)?[a-z]*|[a-z][a-z0-9]*")
+
+STOPWORDS = frozenset("""
+a an and any are as at be but by can do does for from get has have how i if in is it its me my
+of on or our so than that the there this to us we what when where which who why will with you your
+""".split())
+
+
+def _stem(token):
+    # Just enough folding for plural/singular lookups ("refunds" -> "refund", "policies" -> "policy").
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    # Inverted index over the knowledge-base chunks: term -> [(doc, term frequency)], with
+    # the document lengths BM25 needs. Built once per ingest; search() only touches the
+    # postings of the query terms.
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._ids = []
+        self._documents = []
+        self._lengths = []
+        self._postings = defaultdict(list)
+        self._idf = {}
+        self._avg_length = 0.0
+
+    def add(self, doc_id, text):
+        doc = len(self._ids)
+        terms = tokenize(text)
+        self._ids.append(doc_id)
+        self._documents.append(text)
+        self._lengths.append(len(terms))
+        for term, count in Counter(terms).items():
+            self._postings[term].append((doc, count))
+
+    def finalize(self):
+        n = len(self._ids)
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        self._postings = dict(self._postings)
+        return self
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, term):
+        return term in self._idf
+
+    # allowed, when given, is the set of chunk ids that may be returned (a metadata filter).
+    def search(self, query, top_k, allowed=None):
+        terms = set(tokenize(query))
+        scores = defaultdict(float)
+        matched = defaultdict(set)
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self._postings[term]:
+                if allowed is not None and self._ids[doc] not in allowed:
+                    continue
+                norm = 1 - self.b + self.b * self._lengths[doc] / self._avg_length
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                matched[doc].add(term)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [
+            {"id": self._ids[doc], "document": self._documents[doc], "score": score,
+             "matched": len(matched[doc]), "terms": len(terms)}
+            for doc, score in ranked
+        ]
@@ -0,0 +1,515 @@
+import copy
+import time
+import queue
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+                    "TooManyRequests"}
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+def is_retryable(error):
+    # langchain's ModelError subclasses say so themselves; otherwise go by status code or type.
+    retryable = getattr(error, "is_retryable", None)
+    if isinstance(retryable, bool):
+        return retryable
+    if isinstance(error, TimeoutError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def _streams(model, async_api=False):
+    if type(model)._stream is not BaseChatModel._stream:
+        return True
+    return async_api and type(model)._astream is not BaseChatModel._astream
+
+
+def _as_chunk(result: ChatResult) -> ChatGenerationChunk:
+    message = result.generations[0].message
+    return ChatGenerationChunk(message=AIMessageChunk(content=message.content,
+                                                      additional_kwargs=message.additional_kwargs,
+                                                      response_metadata=message.response_metadata,
+                                                      usage_metadata=getattr(message, "usage_metadata", None)))
+
+
+class TokenBucket:
+    # rate requests per second, with up to burst saved up. reserve() takes a token right away
+    # and returns how long the caller has to wait before using it, so threads and coroutines
+    # can share one bucket and sleep in their own way.
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+class ConcurrencyLimit:
+    # A semaphore that threads and coroutines (on any event loop) can wait on together. A
+    # released slot is handed to the oldest waiter, so waiters are served in order.
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            event = threading.Event()
+            self._waiters.append((None, event))
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelled just after the slot was handed over.
+                self.release()
+                raise
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, future))
+                except ValueError:
+                    # Already handed over; _wake() sees the cancelled future and passes it on.
+                    pass
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            loop, waiter = self._waiters.popleft()
+        # The slot passes to the waiter, so active stays the same.
+        if loop is None:
+            waiter.set()
+        else:
+            loop.call_soon_threadsafe(self._wake, waiter)
+
+    def _wake(self, future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+
+def _settle(task):
+    # Losing or abandoned attempts may fail later; their errors are not worth a warning.
+    if not task.cancelled():
+        task.exception()
+
+
+class ResilientChatModel(BaseChatModel):
+    # Wraps the provider's chat model with the protection every chain needs under load:
+    #   - a token bucket (requests_per_second, burst) spacing out upstream calls,
+    #   - at most max_concurrency upstream calls in flight, shared by threads and coroutines,
+    #   - a timeout per attempt and up to max_retries retries of retryable errors (429, 5xx,
+    #     timeouts) with full-jitter exponential backoff, honouring a retry_after hint,
+    #   - hedging: after hedge_after seconds without an answer a second attempt is started
+    #     and the first response wins,
+    #   - single flight: identical prompts already in flight share that call's result.
+    # Streamed calls are retried and time-bounded only until their first chunk (after that the
+    # tokens have reached the user) and are never hedged; a coalesced caller gets the leader's
+    # answer in one piece.
+    inner: BaseChatModel
+    requests_per_second: Optional[float] = None
+    burst: Optional[float] = None
+    max_concurrency: int = 16
+    timeout: Optional[float] = 30.0
+    max_retries: int = 3
+    backoff_base: float = 0.25
+    backoff_max: float = 8.0
+    hedge_after: Optional[float] = None
+    coalesce: bool = True
+
+    _bucket: Optional[TokenBucket] = PrivateAttr(default=None)
+    _slots: ConcurrencyLimit = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _flights: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _counts: Counter = PrivateAttr(default_factory=Counter)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.requests_per_second:
+            self._bucket = TokenBucket(self.requests_per_second, self.burst)
+        self._slots = ConcurrencyLimit(self.max_concurrency)
+        # Runs time-bounded sync attempts; every running attempt holds a slot, so this never queues.
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{self.inner._llm_type}"
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    # Single flight
+    def _key(self, messages: List[BaseMessage], stop, kwargs):
+        if not self.coalesce:
+            return None
+        text = repr(([(m.type, m.content) for m in messages], stop, sorted(kwargs.items())))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    # Returns (flight, leader): the leader makes the upstream call and lands the flight,
+    # everyone else waits on it.
+    def _join(self, key):
+        self._count("calls")
+        if key is None:
+            return None, True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._counts["coalesced"] += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+        # A waiting coroutine that is cancelled must not cancel the flight for the others.
+        flight.set_running_or_notify_cancel()
+        return flight, True
+
+    def _land(self, key, flight, result=None, error=None):
+        if flight is None:
+            return
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    # Admission
+    def _acquire(self):
+        delay = self._bucket.reserve() if self._bucket is not None else 0.0
+        if delay:
+            self._count("throttled_seconds", delay)
+            time.sleep(delay)
+        self._slots.acquire()
+
+    async def _aacquire(self):
+        delay = self._bucket.reserve() if self._bucket is not None else 0.0
+        if delay:
+            self._count("throttled_seconds", delay)
+            await asyncio.sleep(delay)
+        await self._slots.aacquire()
+
+    def _retry_delay(self, retry, error):
+        # Raises the error when it is final; otherwise returns how long to back off.
+        if retry >= self.max_retries or not is_retryable(error):
+            self._count("failures")
+            raise error
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+        retry_after = getattr(error, "retry_after", None)
+        if isinstance(retry_after, (int, float)):
+            delay = max(delay, retry_after)
+        self._count("retries")
+        logger.info(f"LLM call failed ({type(error).__name__}: {error}); retry {retry + 1}/{self.max_retries} "
+                       f"in {delay:.2f}s.")
+        return delay
+
+    def _upstream(self, call):
+        with tracer.span("llm.upstream", model=self.inner._llm_type):
+            self._count("upstream_calls")
+            return call()
+
+    async def _aupstream(self, acall):
+        with tracer.span("llm.upstream", model=self.inner._llm_type):
+            self._count("upstream_calls")
+            return await acall()
+
+    # One attempt (plus its hedge), bounded by the timeout.
+    def _attempt(self, call):
+        if self.timeout is None and self.hedge_after is None:
+            self._acquire()
+            try:
+                return self._upstream(call)
+            finally:
+                self._slots.release()
+        first = self._submit(call)
+        pending, hedge, error = {first}, None, None
+        start = time.monotonic()
+        while pending:
+            done, pending = wait(pending, timeout=self._until_next_limit(start, hedge), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+            elapsed = time.monotonic() - start
+            if self.timeout is not None and elapsed >= self.timeout:
+                # The attempt keeps its slot until it really returns, so upstream concurrency
+                # stays bounded even when callers give up on it.
+                self._count("timeouts")
+                raise LLMTimeoutError(f"No LLM response within {self.timeout:g}s")
+            if pending and hedge is None and self.hedge_after is not None and elapsed >= self.hedge_after:
+                self._count("hedges")
+                hedge = self._submit(call)
+                pending.add(hedge)
+        raise error
+
+    # Seconds until the attempt times out or is due for a hedge; None when neither applies.
+    def _until_next_limit(self, start, hedge):
+        limits = [limit for limit in (self.timeout, self.hedge_after if hedge is None else None) if limit is not None]
+        return max(0.0, min(limits) - (time.monotonic() - start)) if limits else None
+
+    def _submit(self, call):
+        self._acquire()
+        future = self._executor.submit(contextvars.copy_context().run, self._upstream, call)
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    async def _aattempt(self, acall):
+        if self.timeout is None and self.hedge_after is None:
+            await self._aacquire()
+            try:
+                return await self._aupstream(acall)
+            finally:
+                self._slots.release()
+        first = await self._astart(acall)
+        pending, hedge, error = {first}, None, None
+        start = time.monotonic()
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self._until_next_limit(start, hedge),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                elapsed = time.monotonic() - start
+                if self.timeout is not None and elapsed >= self.timeout:
+                    self._count("timeouts")
+                    raise LLMTimeoutError(f"No LLM response within {self.timeout:g}s")
+                if pending and hedge is None and self.hedge_after is not None and elapsed >= self.hedge_after:
+                    self._count("hedges")
+                    hedge = await self._astart(acall)
+                    pending.add(hedge)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _astart(self, acall):
+        await self._aacquire()
+        task = asyncio.ensure_future(self._aupstream(acall))
+        task.add_done_callback(lambda t: self._slots.release())
+        task.add_done_callback(_settle)
+        return task
+
+    def _call(self, call):
+        for retry in range(self.max_retries + 1):
+            try:
+                return self._attempt(call)
+            except Exception as e:
+                time.sleep(self._retry_delay(retry, e))
+
+    async def _acall(self, acall):
+        for retry in range(self.max_retries + 1):
+            try:
+                return await self._aattempt(acall)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(retry, e))
+
+    # BaseChatModel
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        flight, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(flight.result())
+        try:
+            result = self._call(lambda: self.inner._generate(messages, stop=stop, **kwargs))
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        flight, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(flight))
+        try:
+            result = await self._acall(lambda: self.inner._agenerate(messages, stop=stop, **kwargs))
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        key = self._key(messages, stop, kwargs)
+        flight, leader = self._join(key)
+        if not leader:
+            yield _as_chunk(copy.deepcopy(flight.result()))
+            return
+        chunks = []
+        try:
+            for chunk in self._stream_upstream(messages, stop, kwargs):
+                chunks.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, generate_from_stream(iter(chunks)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        key = self._key(messages, stop, kwargs)
+        flight, leader = self._join(key)
+        if not leader:
+            yield _as_chunk(copy.deepcopy(await asyncio.wrap_future(flight)))
+            return
+        chunks = []
+        try:
+            async for chunk in self._astream_upstream(messages, stop, kwargs):
+                chunks.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, generate_from_stream(iter(chunks)))
+
+    def _stream_upstream(self, messages, stop, kwargs):
+        if not _streams(self.inner):
+            yield _as_chunk(self._call(lambda: self.inner._generate(messages, stop=stop, **kwargs)))
+            return
+        for retry in range(self.max_retries + 1):
+            # A pump thread reads the provider's stream, so waiting for the first chunk can time out.
+            self._acquire()
+            chunks, abandoned = queue.SimpleQueue(), threading.Event()
+            self._executor.submit(contextvars.copy_context().run, self._pump, messages, stop, kwargs, chunks, abandoned)
+            try:
+                kind, value = self._next_chunk(chunks, self.timeout)
+            except Exception as e:
+                abandoned.set()
+                time.sleep(self._retry_delay(retry, e))
+                continue
+            try:
+                while kind == "chunk":
+                    yield value
+                    kind, value = self._next_chunk(chunks, None)
+            finally:
+                abandoned.set()
+            return
+
+    def _pump(self, messages, stop, kwargs, chunks, abandoned):
+        try:
+            with tracer.span("llm.upstream", model=self.inner._llm_type, streamed=True):
+                self._count("upstream_calls")
+                for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+                    chunks.put(("chunk", chunk))
+                    if abandoned.is_set():
+                        return
+            chunks.put(("end", None))
+        except Exception as e:
+            chunks.put(("error", e))
+        finally:
+            self._slots.release()
+
+    def _next_chunk(self, chunks, timeout):
+        try:
+            kind, value = chunks.get(timeout=timeout)
+        except queue.Empty:
+            self._count("timeouts")
+            raise LLMTimeoutError(f"No LLM response within {timeout:g}s")
+        if kind == "error":
+            raise value
+        return kind, value
+
+    async def _astream_upstream(self, messages, stop, kwargs):
+        if not _streams(self.inner, async_api=True):
+            yield _as_chunk(await self._acall(lambda: self.inner._agenerate(messages, stop=stop, **kwargs)))
+            return
+        for retry in range(self.max_retries + 1):
+            await self._aacquire()
+            self._count("upstream_calls")
+            stream = self.inner._astream(messages, stop=stop, **kwargs)
+            try:
+                first = await asyncio.wait_for(anext(stream, None), self.timeout)
+            except Exception as e:
+                self._slots.release()
+                await stream.aclose()
+                if isinstance(e, TimeoutError):
+                    self._count("timeouts")
+                    e = LLMTimeoutError(f"No LLM response within {self.timeout:g}s")
+                await asyncio.sleep(self._retry_delay(retry, e))
+                continue
+            try:
+                if first is not None:
+                    yield first
+                    async for chunk in stream:
+                        yield chunk
+            finally:
+                self._slots.release()
+                await stream.aclose()
+            return
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "calls": counts.get("calls", 0),
+            "upstream_calls": counts.get("upstream_calls", 0),
+            "coalesced": counts.get("coalesced", 0),
+            "retries": counts.get("retries", 0),
+            "hedges": counts.get("hedges", 0),
+            "hedge_wins": counts.get("hedge_wins", 0),
+            "timeouts": counts.get("timeouts", 0),
+            "failures": counts.get("failures", 0),
+            "throttled_seconds": round(counts.get("throttled_seconds", 0.0), 3),
+            "in_flight": self._slots.active,
+            "waiting": self._slots.waiting,
+        }
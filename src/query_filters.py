@@ -0,0 +1,38 @@
+import re
+
+# Cheap query -> metadata filter mapping for RAGEngine.search(where=...): keyword patterns
+# name the chunk kinds (see KIND_RULES in src.rag_engine) a question can be answered from.
+# Questions about a feature also look at pricing, since plans list what they include.
+QUERY_KINDS = (
+    (re.compile(r"\b(price|prices|pricing|cost|costs|costing|how much|cheap|expensive|plans?|tiers?|"
+                r"subscriptions?|per month|monthly)\b|\$\d+"), ("pricing",)),
+    (re.compile(r"\b(platforms?|youtube|instagram|tiktok|linkedin|twitter|facebook|twitch|snapchat|"
+                r"pinterest|integrat\w*)\b"), ("platforms",)),
+    (re.compile(r"\b(refunds?|cancel\w*|policy|policies|terms|money back)\b"), ("policies",)),
+    # "support" as a service level, not "do you support TikTok".
+    (re.compile(r"\b((customer|priority|standard|premium) support|support (team|hours|level|options?|included)|"
+                r"what support|help ?desk|24/7)"), ("policies", "pricing")),
+    (re.compile(r"\b(features?|services?|offer|export\w*|4k|\d{3,4}p|resolution|captions?|subtitles?|"
+                r"editing|edit)\b"), ("services", "pricing")),
+    (re.compile(r"\b(who (are|is|makes|built)|about|company|mission|founded|parent)\b"), ("company",)),
+)
+
+# A question touching more kinds than this is broad; filtering it would only risk recall.
+MAX_FILTER_KINDS = 3
+
+
+def kinds_for_query(query):
+    text = query.lower()
+    kinds = []
+    for pattern, matched in QUERY_KINDS:
+        if pattern.search(text):
+            kinds.extend(kind for kind in matched if kind not in kinds)
+    return kinds
+
+
+# Returns a where filter ({"kind": [...]}) or None to search the whole knowledge base.
+def filter_for_query(query):
+    kinds = kinds_for_query(query)
+    if not kinds or len(kinds) > MAX_FILTER_KINDS:
+        return None
+    return {"kind": kinds}
@@ -1,91 +1,621 @@
 import os
+import re
 import json
+import time
+import threading
+import hashlib
 import logging
-from chromadb import PersistentClient
-from sentence_transformers import SentenceTransformer
+from collections import Counter
+from src.cache import LRUCache
+from src.lexical_index import BM25Index
+from src.micro_batcher import MicroBatcher
+from src.tracing import tracer
+from src.vector_store import ChromaVectorStore, NumpyVectorStore, metadata_matches, where_key
 
 logger = logging.getLogger(__name__)
 
+COLLECTION_NAME = "knowledge_base"
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+# What a chunk is about, from its section path; the first matching rule wins. Queries are
+# mapped to the same kinds by src.query_filters.
+KIND_RULES = (
+    ("pricing", re.compile(r"pric|plan")),
+    ("platforms", re.compile(r"platform")),
+    ("policies", re.compile(r"polic|refund")),
+    ("services", re.compile(r"service|feature")),
+    ("company", re.compile(r"about|company|mission")),
+)
+KINDS = tuple(kind for kind, _ in KIND_RULES) + ("general",)
+
+
+def _has_body(chunk):
+    lines = chunk.split("\n")
+    return any(line.strip() for line in (lines[1:] if lines[0].startswith("#") else lines))
+
+
+# Yields (parent heading, chunk) per "#"/"##" section; the parent of a "##" section is the
+# "# " heading above it, and "" for a top-level section. A heading with no text of its own
+# ("# Pricing & Features" above its plans) is not a chunk; it lives on as its children's parent.
+def iter_markdown_sections(lines):
+    current_chunk, parent, top_heading = [], "", ""
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("# ") or line.startswith("## "):
+            chunk = "\n".join(current_chunk).strip()
+            if chunk and _has_body(chunk):
+                yield parent, chunk
+            if line.startswith("# "):
+                top_heading, parent = line[2:].strip(), ""
+            else:
+                parent = top_heading
+            current_chunk = [line]
+        else:
+            current_chunk.append(line)
+    chunk = "\n".join(current_chunk).strip()
+    if chunk and _has_body(chunk):
+        yield parent, chunk
+
+
+def iter_markdown_chunks(lines):
+    for _, chunk in iter_markdown_sections(lines):
+        yield chunk
+
+
+def chunk_markdown(md_text):
+    return list(iter_markdown_chunks(md_text.splitlines()))
+
+
+def _wrap(line, max_chars):
+    # A single line longer than max_chars is cut at spaces.
+    if len(line) <= max_chars:
+        return [line]
+    parts, current = [], ""
+    for word in line.split(" "):
+        if current and len(current) + 1 + len(word) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    return parts + [current] if current else parts
+
+
+# Splits a chunk longer than max_chars at line boundaries. Every piece repeats the chunk's
+# heading and starts with the last overlap_lines lines of the piece before it, so a fact near
+# a cut is still found together with its context.
+def split_chunk(chunk, max_chars=800, overlap_lines=1):
+    if not max_chars or len(chunk) <= max_chars:
+        return [chunk]
+    lines = chunk.split("\n")
+    heading = [lines.pop(0)] if lines[0].startswith("#") else []
+    budget = max(max_chars - sum(len(line) + 1 for line in heading), 1)
+    pieces, current = [], []
+    for line in lines:
+        for part in _wrap(line, budget):
+            if current and len("\n".join(current + [part])) > budget:
+                pieces.append("\n".join(heading + current))
+                current = current[-overlap_lines:] if overlap_lines else []
+                while current and len("\n".join(current + [part])) > budget:
+                    current.pop(0)
+            current.append(part)
+    if current:
+        pieces.append("\n".join(heading + current))
+    return pieces
+
+
+def _list_chunks(prefix, items, max_chars):
+    # Long lists (e.g. supported platforms) become several "section: a, b, ..." chunks.
+    pieces, current = [], []
+    for item in map(str, items):
+        if current and max_chars and len(prefix) + len(", ".join(current + [item])) > max_chars:
+            pieces.append(prefix + ", ".join(current))
+            current = []
+        current.append(item)
+    return pieces + [prefix + ", ".join(current)]
+
+
+def iter_json_chunks(json_obj, max_chars=None):
+    for section, data in json_obj.items():
+        if isinstance(data, list):
+            yield from _list_chunks(f"{section}: ", data, max_chars)
+        elif isinstance(data, dict):
+            for k, v in data.items():
+                if isinstance(v, dict):
+                    details = ", ".join([f"{key}: {val}" for key, val in v.items()])
+                    yield f"{section} - {k}: {details}"
+                else:
+                    yield f"{section} - {k}: {v}"
+        else:
+            yield f"{section}: {data}"
+
+
+def chunk_json(json_obj):
+    return list(iter_json_chunks(json_obj))
+
+
+def chunk_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+# Section a chunk belongs to, comparable across sources: "## Pro Plan" -> "pro_plan" and
+# "pricing_features - pro_plan: ..." -> "pricing_features/pro_plan".
+def chunk_section(chunk, source):
+    if source == "markdown":
+        first_line = chunk.split("\n", 1)[0]
+        return _slug(first_line.lstrip("#")) if first_line.startswith("#") else ""
+    return "/".join(_slug(part) for part in chunk.split(": ", 1)[0].split(" - "))
+
+
+# The outermost section decides ("company_info/platform" is company, not platforms).
+def chunk_kind(path):
+    for part in path:
+        for kind, rule in KIND_RULES:
+            if rule.search(part):
+                return kind
+    return "general"
+
+
+# Metadata stored with every chunk and usable in retrieval filters: source ("markdown" or
+# "json"), file, section (the full path, e.g. "pricing_features/pro_plan" in both sources), kind (see KIND_RULES) and plan ("pro_plan", or "" outside a plan).
+# Values are plain strings, which every vector store can filter on.
+def chunk_metadata(source, file, section, parent=""):
+    path = ([_slug(parent)] if parent else []) + section.split("/")
+    return {
+        "source": source,
+        "file": file,
+        "section": "/".join(path),
+        "kind": chunk_kind(path),
+        "plan": next((part for part in reversed(path) if part.endswith("_plan")), ""),
+    }
+
+
+# Chunk ids hash the metadata along with the text, so the stored metadata that filters run
+# on can never be stale; an unchanged chunk in an unchanged section keeps its embedding.
+def chunk_id(chunk, metadata):
+    return chunk_hash(chunk + "\n" + json.dumps(metadata, sort_keys=True))
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
 class RAGEngine:
-    def __init__(self, md_path, json_path, db_path, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, md_path, json_path, db_path, model_name='all-MiniLM-L6-v2', watch=False,
+                 batch_size=256, query_cache_size=1024, query_cache_ttl=None, cache_results=True,
+                 backend="chroma", vector_dtype="float32", retrieval_mode="dense",
+                 lexical_max_terms=3, rrf_k=60, micro_batch_ms=None, micro_batch_size=32,
+                 model=None, query_cache=None, max_chunk_chars=800, chunk_overlap=1):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
         self.md_path = md_path
         self.json_path = json_path
         self.db_path = db_path
         self.model_name = model_name
-        self._model = None
-        self._collection = None
+        # "chroma" stores the index in a Chroma PersistentClient at db_path; "numpy" keeps it
+        # in-process as a memory-mapped matrix under db_path (vector_dtype picks its precision).
+        self.backend = backend
+        self.vector_dtype = vector_dtype
+        # "dense" ranks by embedding similarity, "lexical" by BM25 over the same chunks, and
+        # "hybrid" fuses both with reciprocal-rank fusion (rrf_k). In hybrid mode a keyword
+        # query of at most lexical_max_terms terms, all found in the best BM25 hit, is answered
+        # from the inverted index alone without encoding the query.
+        self.retrieval_mode = retrieval_mode
+        self.lexical_max_terms = lexical_max_terms
+        self.rrf_k = rrf_k
+        self._lexical = None
+        # Sections longer than max_chunk_chars are split, repeating chunk_overlap lines.
+        self.max_chunk_chars = max_chunk_chars
+        self.chunk_overlap = chunk_overlap
+        # {chunk id: metadata (see chunk_metadata)} for the current chunk set, rebuilt on every sync.
+        self._chunk_metadata = {}
+        # {where_key: set of chunk ids} for the lexical side of filtered searches.
+        self._filter_ids = {}
+        self._chunk_embeddings = LRUCache(maxsize=query_cache_size)
+        self._route_counts = Counter()
+        # Chunks are embedded and written in batches of this size, which bounds ingest memory.
+        self.batch_size = batch_size
+        # When set, search() cache misses from concurrent callers that arrive within
+        # micro_batch_ms of each other are embedded and searched as one batch.
+        self._batcher = MicroBatcher(self._search_batch, max_batch=micro_batch_size, max_wait_ms=micro_batch_ms,
+                                     name="rag-micro-batcher") if micro_batch_ms else None
+        # When set, retrieve() re-syncs the index whenever a source file changes on disk.
+        self.watch = watch
+        # Fingerprint of the indexed chunk set; changes whenever the knowledge base does.
+        self.version = None
+        # A model (and query cache) passed in is shared with other engines, e.g. one per tenant.
+        self._model = model
+        self._store = None
+        # Guards lazy loading and index syncs so one engine can be shared across sessions/threads.
+        self._lock = threading.RLock()
+        self._source_mtimes = None
+        self._warmed = False
+        self.last_ingest_stats = None
+        self._platforms = None
+        # Query vectors depend only on the text and model; result lists are also keyed by version.
+        self._query_cache = query_cache if query_cache is not None else LRUCache(maxsize=query_cache_size,
+                                                                                 ttl=query_cache_ttl)
+        self._result_cache = LRUCache(maxsize=query_cache_size, ttl=query_cache_ttl) if cache_results else None
 
     def get_model(self):
         if self._model is None:
-            self._model = SentenceTransformer(self.model_name)
+            with self._lock:
+                if self._model is None:
+                    # Imported here: torch/transformers take seconds to import.
+                    with tracer.span("rag.load_model", model=self.model_name):
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
         return self._model
 
-    def get_collection(self):
-        if self._collection is None:
-            chroma_client = PersistentClient(path=self.db_path)
-            # Check if collection exists and refresh if needed
-            try:
-                # For this setup, we refresh every time the engine is initialized 
-                # to ensure data consistency, but we could make it smarter.
-                chroma_client.delete_collection(name="knowledge_base")
-            except:
-                pass
-            self._collection = chroma_client.create_collection(name="knowledge_base")
-            self._load_initial_data()
-        return self._collection
-
-    def _load_initial_data(self):
-        if not os.path.exists(self.md_path) or not os.path.exists(self.json_path):
-            logger.warning("Knowledge base files not found.")
+    def get_store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._open_store()
+                    self._sync()
+        return self._store
+
+    # Re-reads the source files and applies only the chunk-level diff to the index.
+    def refresh(self):
+        with self._lock:
+            if self._store is None:
+                self._store = self._open_store()
+            return self._sync()
+
+    def refresh_if_changed(self):
+        if self._store is None or self._read_mtimes() != self._source_mtimes:
+            return self.refresh()
+        return False
+
+    # Loads the model and index and runs one throwaway query, so the first real request
+    # does not pay for lazy initialisation.
+    def warm(self):
+        if self._warmed:
             return
+        start = time.perf_counter()
+        store = self.get_store()
+        store.query(self.get_model().encode(["warm up"], normalize_embeddings=True), 1)
+        self._warmed = True
+        logger.info(f"RAG engine warmed in {time.perf_counter() - start:.2f}s.")
+
+    # Releases the index and everything derived from it; the engine reloads lazily if used again.
+    # A shared model and query cache are left alone.
+    def close(self):
+        with self._lock:
+            if self._batcher is not None:
+                self._batcher.close()
+            if self._store is not None:
+                self._store.close()
+            self._store = None
+            self._lexical = None
+            self._chunk_metadata = {}
+            self._filter_ids = {}
+            self._chunk_embeddings.clear()
+            if self._result_cache is not None:
+                self._result_cache.clear()
+            self._source_mtimes = None
+            self._platforms = None
+            self._warmed = False
+
+    @property
+    def chunk_count(self):
+        return len(self._chunk_metadata)
+
+    def _open_store(self):
+        if self.backend == "numpy":
+            return NumpyVectorStore(self.db_path, self.model_name, dtype=self.vector_dtype)
+        if self.backend == "chroma":
+            return ChromaVectorStore(self.db_path, COLLECTION_NAME, self.model_name)
+        raise ValueError(f"Unknown vector store backend: {self.backend}")
 
+    def _read_mtimes(self):
+        try:
+            return (os.path.getmtime(self.md_path), os.path.getmtime(self.json_path))
+        except OSError:
+            return None
+
+    # Yields (chunk, metadata) for every chunk of the source files.
+    def iter_chunks(self):
+        md_file, json_file = os.path.basename(self.md_path), os.path.basename(self.json_path)
         with open(self.md_path, encoding="utf-8") as f:
-            md_content = f.read()
+            for parent, chunk in iter_markdown_sections(f):
+                metadata = chunk_metadata("markdown", md_file, chunk_section(chunk, "markdown"), parent)
+                for piece in split_chunk(chunk, self.max_chunk_chars, self.chunk_overlap):
+                    yield piece, metadata
         with open(self.json_path, encoding="utf-8") as f:
             json_content = json.load(f)
+        for chunk in iter_json_chunks(json_content, self.max_chunk_chars):
+            yield chunk, chunk_metadata("json", json_file, chunk_section(chunk, "json"))
+
+    def _sync(self):
+        with tracer.span("rag.sync") as span:
+            changed = self._sync_chunks()
+            span.set(**(self.last_ingest_stats or {}))
+        return changed
+
+    def _sync_chunks(self):
+        self._source_mtimes = self._read_mtimes()
+        if not os.path.exists(self.md_path) or not os.path.exists(self.json_path):
+            logger.warning("Knowledge base files not found.")
+            return False
+
+        start = time.perf_counter()
+        # Chunks are keyed by content hash, so unchanged text keeps its id and its stored embedding.
+        existing = self._store.ids()
+        seen = set()
+        lexical = BM25Index()
+        chunk_metadata = {}
+        pending_ids, pending_docs = [], []
+        embedded = 0
+
+        for chunk, metadata in self.iter_chunks():
+            cid = chunk_id(chunk, metadata)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            lexical.add(cid, chunk)
+            chunk_metadata[cid] = metadata
+            if cid in existing:
+                continue
+            pending_ids.append(cid)
+            pending_docs.append(chunk)
+            if len(pending_ids) >= self.batch_size:
+                embedded += self._upsert_batch(pending_ids, pending_docs, chunk_metadata)
+                pending_ids, pending_docs = [], []
+        if pending_ids:
+            embedded += self._upsert_batch(pending_ids, pending_docs, chunk_metadata)
+
+        stale_ids = list(existing - seen)
+        for i in range(0, len(stale_ids), self._write_batch_size()):
+            self._store.delete(stale_ids[i:i + self._write_batch_size()])
+        if stale_ids or embedded:
+            self._store.commit()
+
+        elapsed = time.perf_counter() - start
+        self.version = chunk_hash("\n".join(sorted(seen)))
+        self._lexical = lexical.finalize()
+        self._chunk_metadata = chunk_metadata
+        self._filter_ids = {}
+        self._platforms = None
+        self.last_ingest_stats = {
+            "chunks": len(seen),
+            "embedded": embedded,
+            "removed": len(stale_ids),
+            "reused": len(seen) - embedded,
+            "seconds": elapsed,
+            "chunks_per_sec": embedded / elapsed if embedded and elapsed else 0.0,
+        }
+        changed = bool(stale_ids or embedded)
+        if changed:
+            logger.info(f"Knowledge base synced: {embedded} embedded, {len(stale_ids)} removed, "
+                        f"{len(seen) - embedded} reused in {elapsed:.2f}s "
+                        f"({self.last_ingest_stats['chunks_per_sec']:.1f} chunks/sec).")
+        return changed
+
+    def _write_batch_size(self):
+        max_batch = self._store.max_batch_size()
+        return min(self.batch_size, max_batch) if max_batch else self.batch_size
+
+    def _upsert_batch(self, ids, documents, chunk_metadata):
+        with tracer.span("rag.encode", texts=len(documents)):
+            embeddings = self.get_model().encode(documents, batch_size=self.batch_size, normalize_embeddings=True)
+        step = self._write_batch_size()
+        for i in range(0, len(ids), step):
+            self._store.upsert(
+                ids[i:i + step],
+                embeddings[i:i + step],
+                documents[i:i + step],
+                [{"hash": chunk_id, "model": self.model_name, **chunk_metadata[chunk_id]}
+                 for chunk_id in ids[i:i + step]],
+            )
+        return len(ids)
+
+    # Read once and kept until the next sync or close().
+    def get_supported_platforms(self):
+        platforms = self._platforms
+        if platforms is None:
+            platforms = []
+            if os.path.exists(self.json_path):
+                with open(self.json_path, encoding="utf-8") as f:
+                    platforms = json.load(f).get("supported_platforms", [])
+            self._platforms = platforms
+        return platforms
+
+    def embed_query(self, query):
+        return self.embed_queries([query])[0]
+
+    # Query vectors for several queries; the ones not in the query cache are encoded in one batch.
+    # A query another thread is already encoding (e.g. the intent classifier and the retrieval
+    # prefetch of the same turn) is waited for rather than encoded twice.
+    def embed_queries(self, queries):
+        keys = [normalize_query(query) for query in queries]
+        with tracer.span("rag.embed_query", queries=len(keys)) as span:
+            encoded = []
 
-        def chunk_markdown(md_text):
-            lines = md_text.splitlines()
-            chunks = []
-            current_chunk = []
-            for line in lines:
-                if line.startswith("# ") or line.startswith("## "):
-                    if current_chunk:
-                        chunks.append("\n".join(current_chunk).strip())
-                    current_chunk = [line]
+            def encode(missing):
+                encoded.extend(missing)
+                with tracer.span("rag.encode", texts=len(missing)):
+                    return self.get_model().encode(missing, normalize_embeddings=True)
+
+            embeddings = self._query_cache.get_or_compute_many(keys, encode)
+            span.set(cache_hit=not encoded)
+        return embeddings
+
+    # where restricts the search to chunks whose metadata matches, e.g. {"kind": "pricing"} or
+    # {"kind": ["pricing", "services"], "plan": "pro_plan"} (see chunk_metadata).
+    def retrieve(self, query, top_k=3, mode=None, where=None):
+        return [hit["document"] for hit in self.search(query, top_k, mode, where)]
+
+    def retrieve_many(self, queries, top_k=3, mode=None, where=None):
+        return [[hit["document"] for hit in hits] for hits in self.search_many(queries, top_k, mode, where)]
+
+    def _check_mode(self, mode):
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        return mode
+
+    # Like retrieve(), but returns the hits as dicts with id, document, score, metadata
+    # (see chunk_metadata) and the chunk's stored embedding. Hits may be shared with the
+    # result cache, so callers must not modify them.
+    def search(self, query, top_k=3, mode=None, where=None):
+        mode = self._check_mode(mode)
+        with tracer.span("rag.search", mode=mode, top_k=top_k, filtered=bool(where)) as span:
+            store = self._open_for_search()
+            hits = self._cached_hits(query, top_k, mode, where)
+            span.set(cache_hit=hits is not None)
+            if hits is None:
+                if self._batcher is not None:
+                    # Concurrent misses from other sessions are searched together with this one.
+                    hits = self._batcher.submit((query, top_k, mode, where)).result()
                 else:
-                    current_chunk.append(line)
-            if current_chunk:
-                chunks.append("\n".join(current_chunk).strip())
-            return [c for c in chunks if c]
-
-        def chunk_json(json_obj):
-            chunks = []
-            for section, data in json_obj.items():
-                if isinstance(data, list):
-                    chunks.append(f"{section}: " + ", ".join(data))
-                elif isinstance(data, dict):
-                    for k, v in data.items():
-                        if isinstance(v, dict):
-                            details = ", ".join([f"{key}: {val}" for key, val in v.items()])
-                            chunks.append(f"{section} - {k}: {details}")
-                        else:
-                            chunks.append(f"{section} - {k}: {v}")
+                    hits = self._search_uncached(store, [query], top_k, mode, where)[0]
+            span.set(hits=len(hits))
+        return hits
+
+    # search() for a list of queries: cache misses are embedded in one batch and sent to the
+    # vector store as one query.
+    def search_many(self, queries, top_k=3, mode=None, where=None):
+        mode = self._check_mode(mode)
+        with tracer.span("rag.search_many", mode=mode, top_k=top_k, queries=len(queries), filtered=bool(where)) as span:
+            store = self._open_for_search()
+            results = [self._cached_hits(query, top_k, mode, where) for query in queries]
+            missing = [i for i, hits in enumerate(results) if hits is None]
+            span.set(cache_hits=len(queries) - len(missing))
+            if missing:
+                found = self._search_uncached(store, [queries[i] for i in missing], top_k, mode, where)
+                for i, hits in zip(missing, found):
+                    results[i] = hits
+        return results
+
+    def _open_for_search(self):
+        store = self.get_store()
+        if self.watch:
+            self.refresh_if_changed()
+        return store
+
+    def _result_key(self, query, top_k, mode, where):
+        return (self.version, mode, normalize_query(query), top_k, where_key(where))
+
+    def _cached_hits(self, query, top_k, mode, where=None):
+        if self._result_cache is None:
+            return None
+        hits = self._result_cache.get(self._result_key(query, top_k, mode, where))
+        return list(hits) if hits is not None else None
+
+    # MicroBatcher handler: items are (query, top_k, mode, where) and are searched in one batch
+    # per (top_k, mode, where).
+    def _search_batch(self, items):
+        store = self.get_store()
+        groups = {}
+        for i, (query, top_k, mode, where) in enumerate(items):
+            groups.setdefault((top_k, mode, where_key(where)), []).append(i)
+        results = [None] * len(items)
+        with tracer.span("rag.micro_batch", queries=len(items)):
+            for (top_k, mode, _), indexes in groups.items():
+                found = self._search_uncached(store, [items[i][0] for i in indexes], top_k, mode, items[indexes[0]][3])
+                for i, hits in zip(indexes, found):
+                    results[i] = hits
+        return results
+
+    def _search_uncached(self, store, queries, top_k, mode, where=None):
+        raw = self._search(store, queries, top_k, mode, where)
+        embeddings = self._embeddings_for(store, list(dict.fromkeys(hit["id"] for hits in raw for hit in hits)))
+        results = []
+        for query, hits in zip(queries, raw):
+            hits = [
+                {"id": hit["id"], "document": hit["document"], "score": hit["score"],
+                 "metadata": self._chunk_metadata.get(hit["id"], {}), "embedding": embeddings.get(hit["id"])}
+                for hit in hits
+            ]
+            if self._result_cache is not None:
+                self._result_cache.put(self._result_key(query, top_k, mode, where), tuple(hits))
+            results.append(hits)
+        return results
+
+    def _embeddings_for(self, store, ids):
+        # Chunk ids are content hashes, so a chunk's embedding never changes under its id.
+        embeddings = {}
+        for chunk_id in ids:
+            embedding = self._chunk_embeddings.get(chunk_id)
+            if embedding is not None:
+                embeddings[chunk_id] = embedding
+        missing = [chunk_id for chunk_id in ids if chunk_id not in embeddings]
+        if missing:
+            with tracer.span("rag.get_embeddings", backend=self.backend, ids=len(missing)):
+                fetched = store.get_embeddings(missing)
+            for chunk_id, embedding in fetched.items():
+                self._chunk_embeddings.put(chunk_id, embedding)
+                embeddings[chunk_id] = embedding
+        return embeddings
+
+    # Ids of the chunks matching a filter, for the lexical side of a filtered search.
+    def _allowed_ids(self, where):
+        key = where_key(where)
+        allowed = self._filter_ids.get(key)
+        if allowed is None:
+            allowed = {cid for cid, metadata in self._chunk_metadata.items() if metadata_matches(metadata, where)}
+            self._filter_ids[key] = allowed
+        return allowed
+
+    # Returns one list of raw hits per query.
+    def _search(self, store, queries, top_k, mode, where=None):
+        lexical = self._lexical
+        if mode == "dense" or lexical is None or not len(lexical):
+            self._route_counts["dense"] += len(queries)
+            return self._vector_query(store, queries, top_k, where)
+
+        allowed = self._allowed_ids(where) if where else None
+        # Twice the final size from each side gives the fusion room to reorder.
+        candidates = top_k * 2
+        results, needs_dense = [], []
+        with tracer.span("rag.bm25", top_k=candidates, queries=len(queries)):
+            for i, query in enumerate(queries):
+                lexical_hits = lexical.search(query, candidates, allowed)
+                if mode == "lexical":
+                    self._route_counts["lexical"] += 1
+                    results.append(lexical_hits[:top_k])
+                elif self._is_decisive(lexical_hits):
+                    self._route_counts["lexical_short_circuit"] += 1
+                    results.append(lexical_hits[:top_k])
                 else:
-                    chunks.append(f"{section}: {data}")
-            return chunks
-
-        all_chunks = chunk_markdown(md_content) + chunk_json(json_content)
-        model = self.get_model()
-        embeddings = model.encode(all_chunks)
-        
-        for i, chunk in enumerate(all_chunks):
-            self._collection.add(documents=[chunk], embeddings=[embeddings[i]], ids=[f"chunk_{i}"])
-        logger.info(f"Loaded {len(all_chunks)} chunks into Chroma.")
-
-    def retrieve(self, query, top_k=3):
-        model = self.get_model()
-        collection = self.get_collection()
-        query_emb = model.encode([query])[0]
-        results = collection.query(query_embeddings=[query_emb], n_results=top_k)
-        return results['documents'][0]
+                    self._route_counts["hybrid"] += 1
+                    results.append(lexical_hits)
+                    needs_dense.append(i)
+        if needs_dense:
+            dense = self._vector_query(store, [queries[i] for i in needs_dense], candidates, where)
+            for i, dense_hits in zip(needs_dense, dense):
+                results[i] = self._fuse(dense_hits, results[i], top_k)
+        return results
+
+    def _fuse(self, dense_hits, lexical_hits, top_k):
+        fused, by_id = Counter(), {}
+        for hits in (dense_hits, lexical_hits):
+            for rank, hit in enumerate(hits):
+                fused[hit["id"]] += 1.0 / (self.rrf_k + rank + 1)
+                by_id.setdefault(hit["id"], hit)
+        return [{**by_id[chunk_id], "score": score} for chunk_id, score in fused.most_common(top_k)]
+
+    def _vector_query(self, store, queries, top_k, where=None):
+        query_embs = self.embed_queries(queries)
+        with tracer.span("rag.vector_query", backend=self.backend, top_k=top_k, queries=len(queries)):
+            return store.query(query_embs, top_k, where=where)
+
+    # A short keyword query ("4K", "refund", "$79") whose every term occurs in the top BM25
+    # hit is an exact lookup; the dense ranking would not change which chunks matter.
+    def _is_decisive(self, lexical_hits):
+        if not lexical_hits:
+            return False
+        best = lexical_hits[0]
+        return 0 < best["terms"] <= self.lexical_max_terms and best["matched"] == best["terms"]
+
+    def cache_stats(self):
+        return {
+            "query_embeddings": self._query_cache.stats(),
+            "results": self._result_cache.stats() if self._result_cache is not None else None,
+            "retrieval_routes": dict(self._route_counts),
+            "micro_batches": self._batcher.stats() if self._batcher is not None else None,
+        }
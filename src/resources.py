@@ -0,0 +1,77 @@
+import atexit
+import threading
+import logging
+from src.rag_engine import RAGEngine
+from src.chatbot_agent import AutoStreamAgent, checkpoint_serde
+
+logger = logging.getLogger(__name__)
+
+# Process-wide instances shared by every session (Streamlit tabs, server connections).
+_lock = threading.Lock()
+_rag_engines = {}
+_agents = {}
+_checkpointers = {}
+_lead_stores = {}
+_tenant_registries = {}
+
+
+def get_rag_engine(md_path="source_of_truth.md", json_path="source_of_truth.json", db_path="chroma_db", **options):
+    key = (md_path, json_path, db_path, tuple(sorted(options.items())))
+    with _lock:
+        if key not in _rag_engines:
+            _rag_engines[key] = RAGEngine(md_path=md_path, json_path=json_path, db_path=db_path, **options)
+        return _rag_engines[key]
+
+
+# Conversation state for every session, on disk, keyed by thread id.
+def get_checkpointer(path="sessions.db"):
+    with _lock:
+        if path not in _checkpointers:
+            import sqlite3
+            from langgraph.checkpoint.sqlite import SqliteSaver
+            # SqliteSaver serializes access with its own lock, so one connection serves all threads.
+            _checkpointers[path] = SqliteSaver(sqlite3.connect(path, check_same_thread=False),
+                                               serde=checkpoint_serde())
+        return _checkpointers[path]
+
+
+# Captured leads, written by one background writer per directory.
+def get_lead_store(directory="leads"):
+    with _lock:
+        if directory not in _lead_stores:
+            from src.lead_store import LeadStore
+            _lead_stores[directory] = LeadStore(directory)
+            # Drains leads still queued for the writer when the process exits.
+            atexit.register(_lead_stores[directory].close)
+        return _lead_stores[directory]
+
+
+# Per-tenant knowledge bases under root/<tenant_id>/, sharing one embedding model.
+def get_tenant_registry(root="tenants", **options):
+    key = (root, tuple(sorted(options.items())))
+    with _lock:
+        if key not in _tenant_registries:
+            from src.tenants import TenantRegistry
+            _tenant_registries[key] = TenantRegistry(root=root, **options)
+        return _tenant_registries[key]
+
+
+def get_agent(api_key, llm=None, warm=True, checkpointer=None, lead_store=None, tenants=None, llm_options=None,
+              **engine_options):
+    # With a TenantRegistry the agent answers each session from its tenant's knowledge base.
+    rag_engine = get_rag_engine(**engine_options) if tenants is None else None
+    key = (api_key, id(llm), id(rag_engine), id(checkpointer), id(lead_store), id(tenants),
+           tuple(sorted((llm_options or {}).items())))
+    with _lock:
+        agent = _agents.get(key)
+        if agent is None:
+            agent = AutoStreamAgent(api_key=api_key, rag_engine=rag_engine, llm=llm, checkpointer=checkpointer,
+                                    lead_store=lead_store, tenants=tenants, llm_options=llm_options)
+            _agents[key] = agent
+    if warm and rag_engine is not None:
+        rag_engine.warm()
+    elif warm:
+        # Loading a tenant warms its engine.
+        with tenants.lease():
+            pass
+    return agent
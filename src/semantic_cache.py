@@ -0,0 +1,54 @@
+import threading
+from collections import deque
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.92, maxsize=512):
+        # Minimum cosine similarity between question vectors for a cached answer to be reused.
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = deque(maxlen=maxsize)
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def lookup(self, question_emb, context, version):
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.stack([entry[0] for entry in self._entries])
+                scores = self._matrix @ question_emb
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    _, cached_context, answer, cached_version = self._entries[i]
+                    # Answers are only valid for the knowledge base they were generated from. One
+                    # cache serves several knowledge bases (tenants), so entries of other versions
+                    # are skipped rather than flushed; they age out of the bounded deque.
+                    if cached_version == version and cached_context == context:
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, question_emb, context, answer, version):
+        with self._lock:
+            self._entries.append((np.asarray(question_emb, dtype=np.float32), context, answer, version))
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_llm_calls": self.hits,
+            "size": len(self._entries),
+        }
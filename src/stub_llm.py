@@ -0,0 +1,103 @@
+import time
+import random
+import asyncio
+import re
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+
+def default_responder(prompt: str) -> str:
+    # Gives plausible answers to the agent's three prompts without calling a provider.
+    if "Classification (output only the category name)" in prompt:
+        message = re.search(r'User Message: "(.*)"', prompt)
+        text = (message.group(1) if message else "").lower()
+        if re.search(r"\b(buy|purchase|sign up|sign me up|subscribe|get started)\b", text):
+            return "high_intent"
+        if re.search(r"^(hi|hello|hey)\b|who are you|what is this", text):
+            return "greeting"
+        if "@" in text or len(text.split()) <= 2:
+            return "info_update"
+        return "inquiry"
+    if 'Output only the word "answering" or "questioning"' in prompt:
+        reply = re.search(r'The user replied: "(.*)"', prompt)
+        return "questioning" if reply and "?" in reply.group(1) else "answering"
+    context = re.search(r"Context:\n(.*?)\n\nQuestion:", prompt, re.DOTALL)
+    first_line = context.group(1).strip().splitlines()[0] if context and context.group(1).strip() else ""
+    return f"Based on our documentation: {first_line}".strip()
+
+
+class StubRateLimitError(Exception):
+    # What a provider's HTTP 429 looks like to the client.
+    status_code = 429
+    is_retryable = True
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests (stub)")
+        self.retry_after = retry_after
+
+
+class StubChatModel(BaseChatModel):
+    # Seconds each call takes, to imitate network and generation time.
+    latency: float = 0.0
+    # Fault injection: the share of calls failing with a 429 and the share taking tail_latency
+    # seconds instead of latency.
+    error_rate: float = 0.0
+    tail_rate: float = 0.0
+    tail_latency: float = 0.0
+    # Provider-side quota: calls beyond quota_rps within one second get a 429 with retry_after.
+    quota_rps: Optional[float] = None
+    calls: int = 0
+    rate_limited: int = 0
+    _window: Any = PrivateAttr(default_factory=deque)
+    _quota_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    # Canned outputs: {regex: response}. The first pattern found in the prompt wins over
+    # default_responder, so a replay can pin exact answers or force a classification.
+    canned: Dict[str, str] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call_latency(self) -> float:
+        if self.quota_rps:
+            now = time.monotonic()
+            with self._quota_lock:
+                while self._window and now - self._window[0] >= 1.0:
+                    self._window.popleft()
+                if len(self._window) >= self.quota_rps:
+                    self.rate_limited += 1
+                    raise StubRateLimitError(retry_after=1.0 - (now - self._window[0]))
+                self._window.append(now)
+        if self.error_rate and random.random() < self.error_rate:
+            self.rate_limited += 1
+            raise StubRateLimitError()
+        if self.tail_rate and random.random() < self.tail_rate:
+            return self.tail_latency
+        return self.latency
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        content = next((response for pattern, response in self.canned.items() if re.search(pattern, prompt)), None)
+        if content is None:
+            content = default_responder(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        latency = self._call_latency()
+        if latency:
+            time.sleep(latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        latency = self._call_latency()
+        if latency:
+            await asyncio.sleep(latency)
+        return self._respond(messages)
@@ -0,0 +1,254 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict, defaultdict
+from src.cache import LRUCache
+from src.rag_engine import RAGEngine, normalize_query
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+class _TenantMetrics:
+    def __init__(self):
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.last_load_seconds = None
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+        self.last_used = None
+
+    def as_dict(self):
+        return {
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "avg_load_seconds": self.load_seconds / self.loads if self.loads else 0.0,
+            "last_load_seconds": self.last_load_seconds,
+            "last_used": self.last_used,
+        }
+
+
+class TenantRegistry:
+    # One knowledge base per tenant, served from a single process. A tenant is either
+    # registered explicitly or is a directory root/<tenant_id>/ holding source_of_truth.md
+    # and source_of_truth.json; its index lives in root/<tenant_id>/index unless registered
+    # with its own db_path. Loaded engines are kept in an LRU bounded by max_tenants and by
+    # max_resident_chunks (indexed chunks, which is what a resident index costs in memory);
+    # the least recently used tenants are evicted to stay within both. Engines are handed out
+    # as leases (lease(), or acquire()/release()): an evicted engine that is still leased is
+    # only closed when its last lease is released, and is reused if its tenant comes back
+    # before that. All engines share one embedding model and one query-embedding cache.
+    def __init__(self, root="tenants", max_tenants=8, max_resident_chunks=None, default_tenant=DEFAULT_TENANT,
+                 model_name='all-MiniLM-L6-v2', query_cache_size=4096, **engine_options):
+        self.root = root
+        self.max_tenants = max_tenants
+        self.max_resident_chunks = max_resident_chunks
+        self.default_tenant = default_tenant
+        self.model_name = model_name
+        self.engine_options = engine_options
+        self._model = None
+        self._query_cache = LRUCache(maxsize=query_cache_size)
+        self._registered = {}
+        self._engines = OrderedDict()
+        # {id(engine): open leases}, and evicted engines still leased, by tenant.
+        self._leases = defaultdict(int)
+        self._retired = {}
+        # (tenant_id, engine) evicted and no longer leased, closed once self._lock is released.
+        self._closing = []
+        self._metrics = defaultdict(_TenantMetrics)
+        self._lock = threading.RLock()
+        # Per-tenant locks, so a slow first load of one tenant does not stall the others.
+        self._load_locks = defaultdict(threading.Lock)
+
+    def register(self, tenant_id, md_path, json_path, db_path=None):
+        with self._lock:
+            self._registered[tenant_id] = (md_path, json_path, db_path or os.path.join(self.root, tenant_id, "index"))
+
+    def _paths(self, tenant_id):
+        if tenant_id in self._registered:
+            return self._registered[tenant_id]
+        directory = os.path.join(self.root, tenant_id)
+        md_path = os.path.join(directory, "source_of_truth.md")
+        json_path = os.path.join(directory, "source_of_truth.json")
+        if os.sep in tenant_id or tenant_id.startswith(".") or not (os.path.exists(md_path) and os.path.exists(json_path)):
+            return None
+        return md_path, json_path, os.path.join(directory, "index")
+
+    def has_tenant(self, tenant_id):
+        return self._paths(tenant_id or self.default_tenant) is not None
+
+    def tenants(self):
+        found = set(self._registered)
+        if os.path.isdir(self.root):
+            found.update(name for name in os.listdir(self.root) if self._paths(name) is not None)
+        return sorted(found)
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with tracer.span("rag.load_model", model=self.model_name):
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    # Same contract as RAGEngine.embed_query, for callers that only need the shared model
+    # (e.g. the local intent classifier) and should not load a tenant for it.
+    def embed_query(self, query):
+        return self._query_cache.get_or_compute_many(
+            [normalize_query(query)], lambda missing: self.get_model().encode(missing, normalize_embeddings=True))[0]
+
+    # Returns the tenant's loaded RAGEngine with a lease on it, loading it (and evicting cold
+    # tenants) if needed. Every acquire() must be paired with a release(engine).
+    def acquire(self, tenant_id=None):
+        tenant_id = tenant_id or self.default_tenant
+        try:
+            with self._lock:
+                engine = self._resident(tenant_id)
+                if engine is not None:
+                    return engine
+            with self._load_locks[tenant_id]:
+                with self._lock:
+                    engine = self._resident(tenant_id)
+                    if engine is not None:
+                        return engine
+                # The tenant's previous engine must be closed before its index is opened again.
+                for _, evicted in self._take_closing(tenant_id):
+                    evicted.close()
+                engine = self._load(tenant_id)
+                with self._lock:
+                    self._engines[tenant_id] = engine
+                    self._leases[id(engine)] += 1
+                    self._touch(tenant_id, hit=False)
+                    self._evict(keep=tenant_id)
+            return engine
+        finally:
+            self._close_evicted()
+
+    def release(self, engine):
+        with self._lock:
+            key = id(engine)
+            self._leases[key] -= 1
+            if self._leases[key] > 0:
+                return
+            del self._leases[key]
+            for tenant_id, retired in list(self._retired.items()):
+                if retired is engine:
+                    del self._retired[tenant_id]
+                    self._closing.append((tenant_id, engine))
+                    logger.info(f"Closing evicted tenant {tenant_id} after its last lease.")
+        self._close_evicted()
+
+    def _take_closing(self, tenant_id=None):
+        with self._lock:
+            taken = [item for item in self._closing if tenant_id in (None, item[0])]
+            self._closing = [item for item in self._closing if item[0] != tenant_id] if tenant_id is not None else []
+        return taken
+
+    # engine.close() joins the engine's micro-batcher, so it runs without self._lock held and other
+    # tenants' acquires are not stalled behind it. The tenant's load lock keeps a reload from
+    # opening the same index while the old engine is still closing.
+    def _close_evicted(self):
+        for tenant_id, engine in self._take_closing():
+            with self._load_locks[tenant_id]:
+                engine.close()
+
+    @contextmanager
+    def lease(self, tenant_id=None):
+        engine = self.acquire(tenant_id)
+        try:
+            yield engine
+        finally:
+            self.release(engine)
+
+    def _resident(self, tenant_id):
+        # Called with self._lock held: the loaded (or evicted but still leased) engine, leased.
+        engine = self._engines.get(tenant_id)
+        if engine is None:
+            engine = self._retired.pop(tenant_id, None)
+            if engine is None:
+                return None
+            self._engines[tenant_id] = engine
+            self._evict(keep=tenant_id)
+        self._engines.move_to_end(tenant_id)
+        self._leases[id(engine)] += 1
+        self._touch(tenant_id, hit=True)
+        return engine
+
+    def _touch(self, tenant_id, hit):
+        metrics = self._metrics[tenant_id]
+        if hit:
+            metrics.hits += 1
+        else:
+            metrics.misses += 1
+        metrics.last_used = time.time()
+
+    def _load(self, tenant_id):
+        paths = self._paths(tenant_id)
+        if paths is None:
+            raise KeyError(f"Unknown tenant: {tenant_id}")
+        md_path, json_path, db_path = paths
+        start = time.perf_counter()
+        with tracer.span("tenant.load", tenant=tenant_id):
+            engine = RAGEngine(md_path=md_path, json_path=json_path, db_path=db_path, model_name=self.model_name,
+                               model=self.get_model(), query_cache=self._query_cache, **self.engine_options)
+            engine.warm()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            metrics = self._metrics[tenant_id]
+            metrics.loads += 1
+            metrics.load_seconds += elapsed
+            metrics.last_load_seconds = elapsed
+        logger.info(f"Loaded tenant {tenant_id} ({engine.chunk_count} chunks) in {elapsed:.2f}s.")
+        return engine
+
+    def resident_chunks(self):
+        with self._lock:
+            return sum(engine.chunk_count for engine in self._engines.values())
+
+    def _over_budget(self):
+        if len(self._engines) > self.max_tenants:
+            return True
+        return self.max_resident_chunks is not None and self.resident_chunks() > self.max_resident_chunks
+
+    def _evict(self, keep):
+        # Called with self._lock held; the tenant just loaded is never evicted.
+        while self._over_budget():
+            tenant_id = next((t for t in self._engines if t != keep), None)
+            if tenant_id is None:
+                break
+            engine = self._engines.pop(tenant_id)
+            self._metrics[tenant_id].evictions += 1
+            if self._leases.get(id(engine)):
+                # Still being searched; closed after the last release().
+                self._retired[tenant_id] = engine
+                logger.info(f"Evicted tenant {tenant_id}; closing it once its leases are released.")
+            else:
+                self._closing.append((tenant_id, engine))
+                logger.info(f"Evicted tenant {tenant_id}.")
+
+    def close(self):
+        with self._lock:
+            self._closing.extend(list(self._engines.items()) + list(self._retired.items()))
+            self._engines.clear()
+            self._retired.clear()
+        self._close_evicted()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": list(self._engines),
+                "retiring": list(self._retired),
+                "resident_chunks": self.resident_chunks(),
+                "max_tenants": self.max_tenants,
+                "max_resident_chunks": self.max_resident_chunks,
+                "query_embeddings": self._query_cache.stats(),
+                "tenants": {tenant_id: metrics.as_dict() for tenant_id, metrics in self._metrics.items()},
+            }
@@ -0,0 +1,192 @@
+import time
+import json
+import logging
+import itertools
+import threading
+import contextvars
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the span duration histogram in the Prometheus export.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_span = contextvars.ContextVar("autostream_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    # Returned by span() while tracing is off: entering, leaving and set() do nothing.
+    trace_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def mark(self, status):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "trace_id", "status",
+                 "start", "duration", "_started", "_token")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.status = "ok"
+        self.duration = None
+
+    # Attributes the metrics understand: cache_hit (bool), prompt_tokens and completion_tokens.
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    # A status other than "ok" set before the span ends is kept even if it ends with an
+    # exception (e.g. "interrupted" for a node paused by interrupt()).
+    def mark(self, status):
+        self.status = status
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc_type is not None and self.status == "ok":
+            self.status = "error"
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "name": self.name, "start": self.start, "duration_ms": round(self.duration * 1000, 3),
+                "status": self.status, **self.attrs}
+
+
+class _SpanMetrics:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.errors = 0
+        self.cache = {"hit": 0, "miss": 0}
+        self.tokens = {"prompt": 0, "completion": 0}
+
+    def add(self, span):
+        self.count += 1
+        self.total += span.duration
+        for i, bound in enumerate(BUCKETS):
+            if span.duration <= bound:
+                self.buckets[i] += 1
+                break
+        if span.status == "error":
+            self.errors += 1
+        if "cache_hit" in span.attrs:
+            self.cache["hit" if span.attrs["cache_hit"] else "miss"] += 1
+        for kind in self.tokens:
+            self.tokens[kind] += span.attrs.get(f"{kind}_tokens") or 0
+
+
+class Tracer:
+    # Spans for graph nodes and the calls they make (LLM chains, embedding, vector search),
+    # aggregated into Prometheus-style metrics, kept in a short in-memory history and
+    # optionally appended to a JSONL file. While disabled, span() hands back a shared no-op.
+    def __init__(self, enabled=False, jsonl_path=None, keep=1000):
+        self.enabled = False
+        self.jsonl_path = None
+        self._file = None
+        self._metrics = defaultdict(_SpanMetrics)
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        if enabled or jsonl_path:
+            self.configure(enabled=True, jsonl_path=jsonl_path)
+
+    def configure(self, enabled=True, jsonl_path=None):
+        with self._lock:
+            if self._file is not None and jsonl_path != self.jsonl_path:
+                self._file.close()
+                self._file = None
+            if jsonl_path and self._file is None:
+                self._file = open(jsonl_path, "a", buffering=1)
+            self.jsonl_path = jsonl_path
+            self.enabled = enabled
+        logger.info(f"Tracing {'enabled' if enabled else 'disabled'}{f', writing to {jsonl_path}' if jsonl_path else ''}.")
+
+    def close(self):
+        self.configure(enabled=False)
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def _finish(self, span):
+        with self._lock:
+            self._metrics[span.name].add(span)
+            self._recent.append(span)
+            if self._file is not None:
+                self._file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self._recent.clear()
+
+    # Finished spans of one trace (e.g. a turn), in the order they started.
+    def trace(self, trace_id):
+        with self._lock:
+            spans = [span for span in self._recent if span.trace_id == trace_id]
+        return [span.to_dict() for span in sorted(spans, key=lambda span: (span.start, span.span_id))]
+
+    def metrics(self):
+        with self._lock:
+            return {name: {"count": m.count, "total_ms": m.total * 1000, "errors": m.errors,
+                           "cache": dict(m.cache), "tokens": dict(m.tokens)}
+                    for name, m in self._metrics.items()}
+
+    def prometheus_text(self, prefix="autostream"):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+            lines = [f"# HELP {prefix}_span_duration_seconds Time spent in traced operations.",
+                     f"# TYPE {prefix}_span_duration_seconds histogram"]
+            for name, m in metrics:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, m.buckets):
+                    cumulative += count
+                    lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {m.count}')
+                lines.append(f'{prefix}_span_duration_seconds_sum{{span="{name}"}} {m.total:.6f}')
+                lines.append(f'{prefix}_span_duration_seconds_count{{span="{name}"}} {m.count}')
+            lines += [f"# HELP {prefix}_span_errors_total Traced operations that raised.",
+                      f"# TYPE {prefix}_span_errors_total counter"]
+            lines += [f'{prefix}_span_errors_total{{span="{name}"}} {m.errors}' for name, m in metrics]
+            lines += [f"# HELP {prefix}_cache_lookups_total Cache lookups made inside traced operations.",
+                      f"# TYPE {prefix}_cache_lookups_total counter"]
+            lines += [f'{prefix}_cache_lookups_total{{span="{name}",result="{result}"}} {count}'
+                      for name, m in metrics if any(m.cache.values()) for result, count in m.cache.items()]
+            lines += [f"# HELP {prefix}_llm_tokens_total Estimated LLM tokens sent and generated.",
+                      f"# TYPE {prefix}_llm_tokens_total counter"]
+            lines += [f'{prefix}_llm_tokens_total{{span="{name}",kind="{kind}"}} {count}'
+                      for name, m in metrics if any(m.tokens.values()) for kind, count in m.tokens.items()]
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide tracer used by the agent and the RAG engine; off until configured.
+tracer = Tracer()
@@ -0,0 +1,131 @@
+import time
+import logging
+from langgraph.constants import END
+from src.chatbot_agent import new_session_state
+from src.checkpoints import prune_thread, aprune_thread
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def _ignore(text):
+    pass
+
+
+def _recorder(nodes):
+    # Collects (node, finish time) for every node update of one graph execution.
+    return lambda node: nodes.append((node, time.perf_counter()))
+
+
+class TurnDriver:
+    # Drives one checkpointed session for any front end (terminal, Streamlit, server). Every
+    # user message is exactly one graph execution: a fresh run from START, or a resume of the
+    # lead question the graph is paused on.
+    def __init__(self, agent, thread_id, tenant_id=None):
+        self.agent = agent
+        self.thread_id = thread_id
+        # Only used when the session is started; afterwards it lives in the checkpointed state.
+        self.tenant_id = tenant_id
+        # Whether the graph is paused on an interrupt; None until known, then read from the
+        # checkpointer once (e.g. for a session created by another process).
+        self.waiting = None
+        self.state = None
+        self.last_turn = None
+
+    def _config(self):
+        return self.agent.session_config(self.thread_id)
+
+    def _apply_snapshot(self, snapshot):
+        self.waiting = bool(snapshot.interrupts)
+        self.state = snapshot.values or None
+        return self.state is not None
+
+    # Returns whether the session exists.
+    def load(self):
+        return self._apply_snapshot(self.agent.graph.get_state(self._config()))
+
+    async def aload(self):
+        return self._apply_snapshot(await self.agent.graph.aget_state(self._config()))
+
+    def _input(self, message):
+        if self.waiting:
+            from langgraph.types import Command
+            return Command(resume=message)
+        return {'user_input': message, 'messages': [{'role': 'user', 'content': message}]}
+
+    def _finish(self, state, start, nodes, span):
+        self.state = state
+        self.waiting = "__interrupt__" in state
+        # Nodes run one after another, so each one took from the previous update to its own.
+        node_ms, previous = [], start
+        for node, finished_at in nodes:
+            node_ms.append((node, (finished_at - previous) * 1000))
+            previous = finished_at
+        self.last_turn = {
+            "graph_runs": 1,
+            "nodes": [node for node, _ in nodes],
+            "node_executions": len(nodes),
+            "node_ms": node_ms,
+            "wall_ms": (time.perf_counter() - start) * 1000,
+            # The turn's spans are tracer.trace(trace_id) while tracing is enabled.
+            "trace_id": span.trace_id,
+        }
+        logger.info(f"Turn: {self.last_turn}")
+        return state.get('agent_response')
+
+    # Every turn leaves one new checkpoint; the superseded ones are deleted right away, so a
+    # session's storage does not grow with its length.
+    def _prune(self):
+        with tracer.span("checkpoint.prune"):
+            prune_thread(self.agent.checkpointer, self.thread_id)
+
+    async def _aprune(self):
+        with tracer.span("checkpoint.prune"):
+            await aprune_thread(self.agent.checkpointer, self.thread_id)
+
+    # Deletes the session's state, e.g. when the user clears the conversation.
+    def delete(self):
+        self.agent.checkpointer.delete_thread(self.thread_id)
+        self.waiting, self.state = None, None
+
+    async def adelete(self):
+        await self.agent.checkpointer.adelete_thread(self.thread_id)
+        self.waiting, self.state = None, None
+
+    # Opens the session and returns the greeting.
+    def start(self, on_token=_ignore):
+        start, nodes = time.perf_counter(), []
+        with tracer.span("turn", thread_id=self.thread_id, tenant=self.tenant_id, resume=False) as span:
+            state = self.agent.invoke_streaming(new_session_state(self.tenant_id), on_token, self.thread_id, on_node=_recorder(nodes))
+        self._prune()
+        return self._finish(state, start, nodes, span)
+
+    async def astart(self, on_token=_ignore):
+        start, nodes = time.perf_counter(), []
+        with tracer.span("turn", thread_id=self.thread_id, tenant=self.tenant_id, resume=False) as span:
+            state = await self.agent.ainvoke_streaming(new_session_state(self.tenant_id), on_token, self.thread_id, on_node=_recorder(nodes))
+        await self._aprune()
+        return self._finish(state, start, nodes, span)
+
+    # Sends one user message and returns the agent's response.
+    def send(self, message, on_token=_ignore):
+        if self.waiting is None:
+            self.load()
+        start, nodes = time.perf_counter(), []
+        with tracer.span("turn", thread_id=self.thread_id, resume=bool(self.waiting)) as span:
+            state = self.agent.invoke_streaming(self._input(message), on_token, self.thread_id, on_node=_recorder(nodes))
+        self._prune()
+        return self._finish(state, start, nodes, span)
+
+    async def asend(self, message, on_token=_ignore):
+        if self.waiting is None:
+            await self.aload()
+        start, nodes = time.perf_counter(), []
+        with tracer.span("turn", thread_id=self.thread_id, resume=bool(self.waiting)) as span:
+            state = await self.agent.ainvoke_streaming(self._input(message), on_token, self.thread_id, on_node=_recorder(nodes))
+        await self._aprune()
+        return self._finish(state, start, nodes, span)
+
+    @property
+    def finished(self):
+        return bool(self.state) and self.state.get('step') == END and not self.waiting
@@ -0,0 +1,99 @@
+import re
+
+_WH_WORDS = {"what", "which", "why", "how", "who", "where", "when", "whom", "whose"}
+# Without a "?" these openers are only a hint: "Will Smith Jr" and "May Ann Lee" are names.
+_AUX_STARTS = {"do", "does", "did", "can", "could", "is", "are", "will", "would", "should", "may", "must"}
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Only an explicit introduction counts; "I am not sure" must not become the name "not sure".
+_NAME_PREFIX_RE = re.compile(r"^(?:my name is|my name's|name is|name's|call me)\s+", re.IGNORECASE)
+# A one-letter alias ("X" of "Twitter / X") would match stray letters ("will@x.com", "2 x"), so it only
+# counts as the whole reply; "twitter/x" is matched by the longer name.
+_MIN_ALIAS_CHARS = 2
+_NAME_RE = re.compile(r"^[^\W\d_]+(?:[ '.-][^\W\d_]+){0,3}\.?$")
+# Everyday words that short non-answers ("tell me more", "not right now", "skip this step",
+# "hold on") are made of. A reply containing any of them is left to the LLM.
+_NOT_NAME_WORDS = {
+    "a", "about", "again", "ahead", "already", "also", "am", "an", "and", "anonymous", "any", "anything", "are",
+    "ask", "back", "be", "busy", "but", "buy", "can", "cancel", "continue", "cost", "could", "did", "do", "does",
+    "done", "dont", "don't", "email", "else", "exit", "first", "for", "forget", "free", "from", "get", "give",
+    "go", "good", "great", "had", "has", "have", "hello", "help", "hey", "hi", "hold", "how", "i", "i'm", "idea",
+    "im", "in", "info", "is", "it", "it's", "just", "later", "leave", "let", "let's", "like", "maybe", "may",
+    "me", "mind", "more", "must", "my", "name", "need", "never", "nevermind", "next", "no", "nope", "not",
+    "nothing", "now", "of", "ok", "okay", "on", "one", "or", "platform", "please", "plan", "plans", "prefer",
+    "price", "pricing", "private", "question", "rather", "really", "right", "second", "see", "share", "should",
+    "skip", "so", "sorry", "start", "step", "stop", "sure", "tell", "thank", "thanks", "that", "the", "them",
+    "there", "think", "this", "to", "too", "trial", "unsure", "up", "wait", "want", "was", "we", "what", "when",
+    "where", "which", "who", "why", "will", "with", "won't", "would", "yeah", "yep", "yes", "you", "your",
+}
+
+
+# True for a reply that is clearly a question, None for one that may be ("can you ..."
+# without a "?"), False otherwise.
+def looks_like_question(text):
+    text = text.strip()
+    if text.endswith("?"):
+        return True
+    words = re.findall(r"[a-z']+", text.lower())
+    if not words:
+        return False
+    if words[0] in _WH_WORDS and len(words) > 1:
+        return True
+    return None if words[0] in _AUX_STARTS else False
+
+
+def parse_email(text):
+    match = _EMAIL_RE.search(text)
+    return match.group(0) if match else None
+
+
+def platform_names(supported_platforms):
+    # "YouTube (Long-form, Shorts)" -> "YouTube"; "Twitter / X" -> "Twitter", "X".
+    names = []
+    for entry in supported_platforms:
+        base = entry.split("(")[0]
+        names.extend(part.strip() for part in base.split("/") if part.strip())
+    return names
+
+
+def match_platform(text, supported_platforms):
+    lowered = text.lower()
+    reply = lowered.strip(" .!")
+    for name in platform_names(supported_platforms):
+        if len(name) < _MIN_ALIAS_CHARS:
+            if reply == name.lower():
+                return name
+        elif re.search(rf"(?<!\w){re.escape(name.lower())}(?!\w)", lowered):
+            return name
+    return None
+
+
+def parse_name(text):
+    candidate = _NAME_PREFIX_RE.sub("", text.strip()).strip(" .!")
+    if not _NAME_RE.match(candidate):
+        return None
+    words = re.findall(r"[a-z']+", candidate.lower())
+    return None if any(word in _NOT_NAME_WORDS for word in words) else candidate
+
+
+# Decides locally whether a reply to the lead question for `field` answers it.
+# Returns (verdict, value): verdict is "answering", "questioning" or None when the reply is
+# ambiguous and should go to the LLM; value is the cleaned-up answer when one was recognised.
+def classify_reply(field, text, supported_platforms=()):
+    question = looks_like_question(text)
+    if question:
+        return "questioning", None
+    if question is None:
+        return None, None
+
+    if field == "email":
+        value = parse_email(text)
+    elif field == "platform":
+        value = match_platform(text, supported_platforms)
+    elif field == "name":
+        value = parse_name(text)
+    else:
+        value = None
+
+    if value is not None:
+        return "answering", value
+    return None, None
@@ -0,0 +1,386 @@
+import os
+import json
+import mmap
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Metadata filters are {field: value} or {field: [values]}; a chunk matches when every field
+# equals the value (or one of the values).
+def metadata_matches(metadata, where):
+    for field, wanted in where.items():
+        value = metadata.get(field)
+        if isinstance(wanted, (list, tuple, set, frozenset)):
+            if value not in wanted:
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+# Hashable form of a filter, for cache keys; None for no filter.
+def where_key(where):
+    if not where:
+        return None
+    return tuple(sorted((field, tuple(sorted(wanted)) if isinstance(wanted, (list, tuple, set, frozenset)) else wanted)
+                        for field, wanted in where.items()))
+
+
+def _chroma_where(where):
+    clauses = [{field: {"$in": list(wanted)}} if isinstance(wanted, (list, tuple, set, frozenset)) else {field: wanted}
+               for field, wanted in where.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+# Minimal interface RAGEngine needs from a vector index. Embeddings are expected to be
+# L2-normalized, and query() returns, per query vector, hits ordered by descending cosine score,
+# searching only the chunks whose metadata matches where (see metadata_matches) when given.
+class VectorStore:
+    def ids(self):
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, embeddings, top_k, where=None):
+        raise NotImplementedError
+
+    # Stored vectors for the given ids, as {id: vector}; unknown ids are left out.
+    def get_embeddings(self, ids):
+        raise NotImplementedError
+
+    def max_batch_size(self):
+        return None
+
+    # Persists pending writes; called once at the end of an ingest.
+    def commit(self):
+        pass
+
+    # Releases the index's memory and file handles; the store is not used afterwards.
+    def close(self):
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, path, name, model_name):
+        from chromadb import PersistentClient
+        client = PersistentClient(path=path)
+        collection = client.get_or_create_collection(name=name, metadata={"model": model_name})
+        if (collection.metadata or {}).get("model") != model_name:
+            # Vectors from a different model are not comparable, so this is the one case we rebuild.
+            logger.info(f"Embedding model changed to {model_name}; rebuilding index.")
+            client.delete_collection(name=name)
+            collection = client.create_collection(name=name, metadata={"model": model_name})
+        self._client = client
+        self._collection = collection
+
+    def ids(self):
+        return set(self._collection.get(include=[])['ids'])
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._collection.upsert(
+            ids=list(ids),
+            documents=list(documents),
+            embeddings=[np.asarray(e, dtype=np.float32).tolist() for e in embeddings],
+            metadatas=list(metadatas),
+        )
+
+    def delete(self, ids):
+        self._collection.delete(ids=list(ids))
+
+    def query(self, embeddings, top_k, where=None):
+        results = self._collection.query(
+            query_embeddings=[np.asarray(e, dtype=np.float32).tolist() for e in embeddings],
+            n_results=top_k,
+            where=_chroma_where(where) if where else None,
+            include=["documents", "metadatas", "distances"],
+        )
+        hits = []
+        for ids, docs, metas, dists in zip(results['ids'], results['documents'],
+                                           results['metadatas'], results['distances']):
+            # Chroma's default space is squared L2; for unit vectors cos = 1 - d / 2.
+            hits.append([
+                {"id": i, "document": d, "metadata": m or {}, "score": 1.0 - dist / 2.0}
+                for i, d, m, dist in zip(ids, docs, metas, dists)
+            ])
+        return hits
+
+    def get_embeddings(self, ids):
+        result = self._collection.get(ids=list(ids), include=["embeddings"])
+        return {i: np.asarray(e, dtype=np.float32) for i, e in zip(result['ids'], result['embeddings'])}
+
+    def max_batch_size(self):
+        return self._client.get_max_batch_size()
+
+    def close(self):
+        # Client.close() only exists in newer chromadb releases.
+        close = getattr(self._client, "close", None)
+        if close is not None:
+            close()
+        self._collection = None
+
+
+class NumpyVectorStore(VectorStore):
+    # Keeps all embeddings in one contiguous matrix and answers a query with a single
+    # matrix-vector product. The matrix is persisted as .npy and opened memory-mapped, so
+    # processes serving the same index share its pages. With dtype "float16" or "int8" the
+    # scan runs over a compressed copy and the best candidates are re-scored in float32.
+    SCAN_BLOCK = 8192
+    RESCORE_FACTOR = 4
+
+    def __init__(self, path, model_name, dtype="float32"):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.path = path
+        self.model_name = model_name
+        self.dtype = dtype
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._matrix = None
+        self._rows = None
+        self._scan = None
+        self._scales = None
+        # Row indexes matching each metadata filter seen so far, keyed by where_key().
+        self._filters = {}
+        self._pending = []
+        self._deleted = set()
+        # Held while the index state is rebuilt or swapped (writes, consolidation, commit, close).
+        # A query only holds it to take a consistent snapshot, then scores without it, so a
+        # refresh never shows it a missing matrix or ids that don't line up with the rows.
+        self._lock = threading.RLock()
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("index.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            logger.info(f"Embedding model changed to {self.model_name}; rebuilding index.")
+            return
+        self._ids = meta["ids"]
+        self._documents = meta["documents"]
+        self._metadatas = meta["metadatas"]
+        if not self._ids:
+            return
+        self._matrix = np.load(self._file("embeddings.npy"), mmap_mode="r")
+        if self.dtype != "float32":
+            if meta.get("scan_dtype") == self.dtype:
+                self._scan = np.load(self._file(f"embeddings.{self.dtype}.npy"), mmap_mode="r")
+                if self.dtype == "int8":
+                    self._scales = np.load(self._file("scales.npy"), mmap_mode="r")
+                # Only re-scored rows are read from the float32 file; stop readahead from
+                # paging in the rest of it.
+                mapping = getattr(self._matrix, "_mmap", None)
+                if mapping is not None and hasattr(mmap, "MADV_RANDOM"):
+                    mapping.madvise(mmap.MADV_RANDOM)
+            else:
+                self._build_scan()
+
+    def __len__(self):
+        return len(self._snapshot()[0])
+
+    def ids(self):
+        return set(self._snapshot()[0])
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        batch = (list(ids), np.asarray(embeddings, dtype=np.float32), list(documents), list(metadatas))
+        with self._lock:
+            self._pending.append(batch)
+
+    def delete(self, ids):
+        with self._lock:
+            self._deleted.update(ids)
+
+    # (ids, documents, metadatas, matrix, scan, scales, filters) of the current index, with any
+    # pending writes applied. Each is replaced rather than mutated when the index changes.
+    def _snapshot(self):
+        with self._lock:
+            self._consolidate()
+            return self._ids, self._documents, self._metadatas, self._matrix, self._scan, self._scales, self._filters
+
+    def _consolidate(self):
+        if not self._pending and not self._deleted:
+            return
+        # Latest pending write per id, as (batch, row); a later upsert of the same id wins.
+        latest = {}
+        for b, (batch_ids, _, _, _) in enumerate(self._pending):
+            for row, chunk_id in enumerate(batch_ids):
+                if chunk_id not in self._deleted:
+                    latest[chunk_id] = (b, row)
+        keep = [i for i, chunk_id in enumerate(self._ids)
+                if chunk_id not in self._deleted and chunk_id not in latest]
+
+        dim = self._matrix.shape[1] if self._matrix is not None else None
+        if dim is None and self._pending:
+            dim = self._pending[0][1].shape[1]
+        total = len(keep) + len(latest)
+        matrix = np.empty((total, dim), dtype=np.float32) if total else None
+
+        ids = [self._ids[i] for i in keep]
+        documents = [self._documents[i] for i in keep]
+        metadatas = [self._metadatas[i] for i in keep]
+        for start in range(0, len(keep), self.SCAN_BLOCK):
+            rows = keep[start:start + self.SCAN_BLOCK]
+            matrix[start:start + len(rows)] = self._matrix[rows]
+
+        # Copy pending batches into place one at a time, releasing each as we go.
+        position = len(keep)
+        pending, self._pending = self._pending, []
+        for b in range(len(pending)):
+            batch_ids, vectors, batch_docs, batch_metas = pending[b]
+            rows = [row for row, chunk_id in enumerate(batch_ids) if latest.get(chunk_id) == (b, row)]
+            matrix[position:position + len(rows)] = vectors[rows]
+            position += len(rows)
+            ids.extend(batch_ids[row] for row in rows)
+            documents.extend(batch_docs[row] for row in rows)
+            metadatas.extend(batch_metas[row] for row in rows)
+            pending[b] = None
+
+        self._ids, self._documents, self._metadatas = ids, documents, metadatas
+        self._matrix = matrix
+        self._rows, self._filters = None, {}
+        self._deleted = set()
+        self._build_scan()
+
+    def _build_scan(self):
+        matrix, scan, scales = self._matrix, None, None
+        if matrix is not None and self.dtype == "float16":
+            scan = matrix.astype(np.float16)
+        elif matrix is not None and self.dtype == "int8":
+            scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12).astype(np.float32) / 127.0
+            scan = np.empty(matrix.shape, dtype=np.int8)
+            for start in range(0, len(scan), self.SCAN_BLOCK):
+                block = matrix[start:start + self.SCAN_BLOCK] / scales[start:start + self.SCAN_BLOCK, None]
+                scan[start:start + len(block)] = np.round(block)
+        self._scan, self._scales = scan, scales
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        self._consolidate()
+        os.makedirs(self.path, exist_ok=True)
+        files = {"embeddings.npy": self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)}
+        if self._scan is not None:
+            files[f"embeddings.{self.dtype}.npy"] = self._scan
+        if self._scales is not None:
+            files["scales.npy"] = self._scales
+        for name, array in files.items():
+            tmp = self._file(name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, self._file(name))
+        meta = {
+            "model": self.model_name,
+            "scan_dtype": self.dtype,
+            "ids": self._ids,
+            "documents": self._documents,
+            "metadatas": self._metadatas,
+        }
+        tmp = self._file("index.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("index.json"))
+        # Re-open memory-mapped so the in-memory copies are dropped in favour of shared pages.
+        self._matrix, self._scan, self._scales, self._rows = None, None, None, None
+        self._filters = {}
+        self._load()
+
+    def close(self):
+        with self._lock:
+            self._matrix, self._scan, self._scales, self._rows = None, None, None, None
+            self._filters = {}
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._pending, self._deleted = [], set()
+
+    def get_embeddings(self, ids):
+        with self._lock:
+            self._consolidate()
+            if self._rows is None:
+                self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            rows, matrix = self._rows, self._matrix
+        return {i: np.array(matrix[rows[i]]) for i in ids if i in rows}
+
+    def _scores(self, matrix, queries, scales=None):
+        # Blockwise so compressed matrices are widened to float32 a slice at a time.
+        if matrix.dtype == np.float32:
+            return np.asarray(matrix @ queries.T)
+        scores = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], self.SCAN_BLOCK):
+            block = np.asarray(matrix[start:start + self.SCAN_BLOCK], dtype=np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        if scales is not None:
+            scores *= np.asarray(scales)[:, None]
+        return scores
+
+    @staticmethod
+    def _filter_rows(metadatas, filters, where):
+        key = where_key(where)
+        rows = filters.get(key)
+        if rows is None:
+            rows = np.array([row for row, metadata in enumerate(metadatas) if metadata_matches(metadata, where)],
+                            dtype=np.int64)
+            filters[key] = rows
+        return rows
+
+    def query(self, embeddings, top_k, where=None):
+        ids, documents, metadatas, matrix, scan, scales, filters = self._snapshot()
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if matrix is None or not len(ids):
+            return [[] for _ in range(len(queries))]
+
+        # A filter restricts the search to the matching rows. A narrow one (at most a quarter of
+        # the rows) gathers and scores just those; for a wider one, copying the rows costs more
+        # than scoring the contiguous matrix and keeping the matching scores.
+        subset = self._filter_rows(metadatas, filters, where) if where else None
+        if subset is not None and not len(subset):
+            return [[] for _ in range(len(queries))]
+        gather = subset is not None and len(subset) * 4 <= len(ids)
+
+        def pick(array):
+            return array[subset] if gather and array is not None else array
+
+        n = len(ids) if subset is None else len(subset)
+        if scan is not None:
+            scores = self._scores(pick(scan), queries, pick(scales))
+            pool = min(n, top_k * self.RESCORE_FACTOR)
+        else:
+            scores = self._scores(pick(matrix), queries)
+            pool = min(n, top_k)
+        if subset is not None and not gather:
+            scores = scores[subset]
+
+        results = []
+        for column in range(queries.shape[0]):
+            col = scores[:, column]
+            candidates = np.argpartition(-col, pool - 1)[:pool] if pool < n else np.arange(n)
+            if scan is not None:
+                # Re-score the shortlist exactly against the float32 rows.
+                candidates = np.sort(candidates)
+                positions = candidates if subset is None else subset[candidates]
+                exact = np.asarray(matrix[positions]) @ queries[column]
+                order = np.argsort(-exact)[:top_k]
+                rows, row_scores = positions[order], exact[order]
+            else:
+                order = np.argsort(-col[candidates])[:top_k]
+                positions = candidates if subset is None else subset[candidates]
+                rows, row_scores = positions[order], col[candidates][order]
+            results.append([
+                {"id": ids[r], "document": documents[r],
+                 "metadata": metadatas[r], "score": float(s)}
+                for r, s in zip(rows, row_scores)
+            ])
+        return results
@@ -1,9 +1,10 @@
 import streamlit as st
 import logging
 import os
-from src.rag_engine import RAGEngine
-from src.chatbot_agent import AutoStreamAgent
-from langgraph.graph import END
+import uuid
+from src.resources import get_agent, get_checkpointer, get_lead_store
+from src.turn_driver import TurnDriver
+from src.tracing import tracer
 
 # --- CONFIGURATION & STYLING ---
 st.set_page_config(
@@ -45,6 +46,13 @@ try:
 except ImportError:
     GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Inquiry-style sample questions; their answers are pre-computed into the agent's answer cache.
+WARM_QUESTIONS = [
+    "What services do you provide?",
+    "Tell me about your pricing plans.",
+    "How does the AI captioning work?",
+]
+
 # --- LOGGING ---
 logging.basicConfig(level=logging.WARNING)
 
@@ -62,8 +70,11 @@ with st.sidebar:
     
     st.subheader("Quick Actions")
     if st.button("Clear Conversation"):
+        # The old session is never resumed, so its checkpoint is deleted rather than left behind.
+        if st.session_state.get("driver") is not None:
+            st.session_state.driver.delete()
         st.session_state.messages = []
-        st.session_state.agent_state = None
+        st.session_state.driver = None
         st.rerun()
     
     st.markdown("---")
@@ -86,41 +97,43 @@ if not GEMINI_API_KEY:
     st.stop()
 
 # --- INITIALIZATION ---
-if "rag_engine" not in st.session_state:
-    st.session_state.rag_engine = RAGEngine(
-        md_path="source_of_truth.md",
-        json_path="source_of_truth.json",
-        db_path="chroma_db"
-    )
+# The embedding model, vector index and compiled graph are loaded once per server process
+# and shared by every browser session. Conversation state is kept in the SQLite
+# checkpointer; st.session_state only holds the session's driver and the transcript on screen.
+@st.cache_resource(show_spinner="Loading the AutoStream knowledge base...")
+def load_agent(api_key):
+    agent = get_agent(api_key, checkpointer=get_checkpointer(), lead_store=get_lead_store())
+    agent.warm_answer_cache(WARM_QUESTIONS)
+    return agent
+
+agent = load_agent(GEMINI_API_KEY)
 
-if "agent" not in st.session_state:
-    st.session_state.agent = AutoStreamAgent(
-        api_key=GEMINI_API_KEY, 
-        rag_engine=st.session_state.rag_engine
+with st.sidebar:
+    stats = agent.cache_stats()
+    answer_stats, prompt_stats = stats["answers"], stats["prompts"]
+    st.caption(
+        f"Answer cache: {answer_stats['hit_rate']:.0%} hit rate, "
+        f"{answer_stats['saved_llm_calls']} LLM calls saved"
+    )
+    st.caption(
+        f"RAG prompts: ~{prompt_stats['avg_prompt_tokens']:.0f} tokens on average, "
+        f"~{prompt_stats['context_tokens_saved']} context tokens saved by deduplication"
     )
+    # The tracer is shared by the whole process, so this switch applies to every session.
+    debug = st.toggle("Debug tracing", value=tracer.enabled)
+    if debug != tracer.enabled:
+        tracer.configure(enabled=debug)
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-# Initialize agent state if needed
-if st.session_state.get("agent_state") is None:
-    st.session_state.agent_state = {
-        'messages': [],
-        'intent': None,
-        'lead_captured': False,
-        'step': 'greetings',
-        'user_input': None,
-        'agent_response': None,
-        'lead_state': None,
-        'is_streamlit': True,
-        'asked_name': False,
-        'asked_email': False,
-        'asked_platform': False
-    }
+# Start a new conversation thread if needed
+if st.session_state.get("driver") is None:
+    st.session_state.driver = TurnDriver(agent, uuid.uuid4().hex)
     # Get initial greeting
-    st.session_state.agent_state = st.session_state.agent.graph.invoke(st.session_state.agent_state)
-    if st.session_state.agent_state.get('agent_response'):
-        st.session_state.messages.append({"role": "assistant", "content": st.session_state.agent_state['agent_response']})
+    greeting = st.session_state.driver.start()
+    if greeting:
+        st.session_state.messages.append({"role": "assistant", "content": greeting})
 
 # --- CHAT DISPLAY ---
 for msg in st.session_state.messages:
@@ -166,29 +179,36 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Prepare agent state for next run
-    st.session_state.agent_state['user_input'] = prompt
-    st.session_state.agent_state['messages'].append({'role': 'user', 'content': prompt})
-    
-    # Force flow logic
-    is_mid_qual = (
-        st.session_state.agent_state.get('asked_name') or 
-        st.session_state.agent_state.get('asked_email') or 
-        st.session_state.agent_state.get('asked_platform')
-    )
-    st.session_state.agent_state['step'] = 'lead_qual' if is_mid_qual else 'intent'
-
-    # Execute Graph
+    # One graph execution per message: a new question, or the reply to a pending lead question.
     with st.spinner("Processing..."):
-        # The loop handles nodes that don't wait for input
-        while st.session_state.agent_state.get('step') not in ['await_user', END]:
-            st.session_state.agent_state = st.session_state.agent.graph.invoke(st.session_state.agent_state)
-            
-            # Display any response generated by the node
-            if st.session_state.agent_state.get('agent_response'):
-                content = st.session_state.agent_state['agent_response']
-                st.session_state.messages.append({"role": "assistant", "content": content})
-                with st.chat_message("assistant"):
-                    st.markdown(content)
-                # Clear response field so it doesn't duplicate in the next iteration
-                st.session_state.agent_state['agent_response'] = None
+        # Display the response as it is generated
+        streamed = {"text": "", "placeholder": None}
+
+        def show_token(text):
+            if streamed["placeholder"] is None:
+                streamed["placeholder"] = st.chat_message("assistant").empty()
+            streamed["text"] += text
+            streamed["placeholder"].markdown(streamed["text"] + "▌")
+
+        content = st.session_state.driver.send(prompt, show_token)
+
+        if content:
+            st.session_state.messages.append({"role": "assistant", "content": content})
+            if streamed["placeholder"] is not None:
+                streamed["placeholder"].markdown(content)
+
+# --- DEBUG PANEL ---
+last_turn = st.session_state.driver.last_turn
+if tracer.enabled and last_turn and last_turn.get("trace_id"):
+    spans = tracer.trace(last_turn["trace_id"])
+    depth = {}
+    rows = []
+    for span in spans:
+        depth[span["span_id"]] = depth.get(span["parent_id"], -1) + 1
+        details = {k: v for k, v in span.items()
+                   if k not in ("trace_id", "span_id", "parent_id", "name", "start", "duration_ms", "status")}
+        rows.append({"span": "  " * depth[span["span_id"]] + span["name"], "ms": span["duration_ms"],
+                     "status": span["status"], "details": ", ".join(f"{k}={v}" for k, v in details.items())})
+    with st.sidebar.expander("Last turn trace", expanded=True):
+        st.caption(f"{last_turn['wall_ms']:.0f} ms, {len(spans)} spans")
+        st.dataframe(rows, hide_index=True)